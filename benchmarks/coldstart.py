@@ -0,0 +1,72 @@
+"""Cold start: how long a fresh worker process takes to serve its first request.
+
+    python -m benchmarks.coldstart [--db-url URL] [--runs 5] [--budget-ms 3000]
+
+Each run is a new interpreter that imports simplecrud.main, runs the app's startup
+(pool prewarm and warm queries when DB_PREWARM_CONNECTIONS / STARTUP_WARM_QUERIES
+are set) and makes one list request. Reports the median of each phase and exits 1
+when the median total, interpreter start included, is over --budget-ms.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Runs in the child; prints its phase timings as one JSON line
+CHILD = """
+import json, time
+start = time.perf_counter()
+import simplecrud.main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(simplecrud.main.app) as client:
+    started = time.perf_counter()
+    status = client.get("/api/films/?limit=10").status_code
+    served = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "startup_ms": (started - imported) * 1000,
+                  "first_request_ms": (served - started) * 1000, "status": status}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-url", default=os.environ.get("BENCH_DB_URL"))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--films", type=int, default=1000)
+    parser.add_argument("--budget-ms", type=float, default=3000)
+    args = parser.parse_args()
+
+    db_url = args.db_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='simplecrud-cold-'), 'cold.db')}"
+    # simplecrud reads its settings at import time, so configure it before importing
+    os.environ["DB_URL"] = db_url
+    from benchmarks.datagen import DatasetSpec, generate
+    from simplecrud.database import get_engine
+
+    engine = get_engine()
+    generate(engine, DatasetSpec(films=args.films))
+    engine.dispose()
+
+    runs = []
+    for _ in range(args.runs):
+        t0 = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", CHILD], capture_output=True, text=True, check=True).stdout
+        timings = json.loads(out.strip().splitlines()[-1])
+        timings["total_ms"] = (time.perf_counter() - t0) * 1000
+        runs.append(timings)
+    summary = {key: round(statistics.median(run[key] for run in runs), 1)
+               for key in ("import_ms", "startup_ms", "first_request_ms", "total_ms")}
+    print(json.dumps({"database": engine.dialect.name, "runs": args.runs, **summary}))
+    if any(run["status"] >= 400 for run in runs):
+        print("first request failed")
+        sys.exit(1)
+    if summary["total_ms"] > args.budget_ms:
+        print(f"cold start {summary['total_ms']}ms is over the {args.budget_ms}ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
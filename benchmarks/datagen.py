@@ -0,0 +1,85 @@
+"""Deterministic dataset generator for the benchmarks.
+
+The same seed and counts always produce the same rows, inserted in the same
+order into freshly created tables, so ids line up run to run.
+"""
+import random
+from dataclasses import dataclass
+
+from sqlalchemy import insert
+
+GENRES = ["drama", "comedy", "thriller", "horror", "documentary", "animation", "romance", "sci-fi", "western", "noir"]
+
+
+@dataclass
+class DatasetSpec:
+    users: int = 500
+    films: int = 2000
+    companies: int = 100
+    crew_per_film: int = 3
+    staff_per_company: int = 5
+    seed: int = 42
+
+
+@dataclass
+class Dataset:
+    user_ids: list[int]
+    film_ids: list[int]
+    company_ids: list[int]
+
+
+def _insert(conn, model, rows: list[dict]) -> list[int]:
+    if not rows:
+        return []
+    stmt = insert(model.__table__).returning(model.id, sort_by_parameter_order=True)
+    return list(conn.execute(stmt, rows).scalars())
+
+
+def generate(engine, spec: DatasetSpec) -> Dataset:
+    # Imported late: simplecrud reads DB_URL when it is first imported
+    from simplecrud import models, stats
+
+    rng = random.Random(spec.seed)
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as conn:
+        user_ids = _insert(conn, models.User, [
+            {"first_name": f"First{i}", "last_name": f"Last{rng.randrange(spec.users)}",
+             "email": f"user{i}@bench.example", "minimun_fee": rng.randrange(1, 10_000)}
+            for i in range(spec.users)
+        ])
+        company_ids = _insert(conn, models.Company, [
+            {"name": f"Company {i}", "contact_email_address": f"contact{i}@bench.example", "phone_number": f"555{i:07d}"}
+            for i in range(spec.companies)
+        ])
+        film_genres = {}
+        films = []
+        for i in range(spec.films):
+            films.append({
+                "title": f"Film {i}", "description": f"Generated film {i} " * rng.randrange(1, 10),
+                "budget": rng.randrange(10_000, 100_000_000), "release_year": rng.randrange(1950, 2024),
+                "company_id": rng.choice(company_ids) if company_ids and rng.random() < 0.9 else None,
+            })
+            film_genres[i] = rng.sample(GENRES, rng.randrange(1, 4))
+        film_ids = _insert(conn, models.Film, films)
+        models.link_genres(conn, {film_ids[i]: genres for i, genres in film_genres.items()})
+
+        if user_ids:
+            crew = {
+                (rng.choice(user_ids), film_id): rng.choice(["director", "producer", "writer"])
+                for film_id in film_ids for _ in range(spec.crew_per_film)
+            }
+            staff = {
+                (rng.choice(user_ids), company_id): rng.choice(["owner", "member"])
+                for company_id in company_ids for _ in range(spec.staff_per_company)
+            }
+            if crew:
+                conn.execute(insert(models.FilmCrewMembers.__table__),
+                             [{"user_id": u, "film_id": f, "role": role} for (u, f), role in crew.items()])
+            if staff:
+                conn.execute(insert(models.CompanyStaff.__table__),
+                             [{"user_id": u, "company_id": c, "role": role} for (u, c), role in staff.items()])
+        stats.rebuild(conn)
+
+    return Dataset(user_ids, film_ids, company_ids)
@@ -0,0 +1,304 @@
+"""Route benchmark: seeded data, every route, latency percentiles and SQL counts.
+
+    python -m benchmarks.run [--target inprocess|uvicorn] [--db-url URL] [--requests 200]
+                             [--out results.json] [--baseline baseline.json] [--threshold 0.2]
+
+Runs against a throwaway SQLite file unless --db-url (or BENCH_DB_URL) points
+at a local Postgres. "inprocess" drives the ASGI app through the test client
+and counts SQL statements per request; "uvicorn" starts a real server on a
+local port and measures over HTTP with --concurrency client threads. With
+--baseline, routes whose p95 or statement count regressed by more than
+--threshold are listed and the exit status is 1, for CI.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.datagen import Dataset, DatasetSpec
+
+
+def _user_payload(n: int) -> dict:
+    return {"first_name": "Bench", "last_name": f"User{n}", "email": f"bench{n}-{os.getpid()}@bench.example",
+            "minimun_fee": 100}
+
+
+def _film_payload(n: int) -> dict:
+    return {"title": f"Bench {n}-{os.getpid()}"[:32], "budget": 1000, "release_year": 2000, "genres": ["drama"]}
+
+
+def _company_payload(n: int) -> dict:
+    return {"name": f"Bench {n}-{os.getpid()}"[:32], "contact_email_address": "bench@bench.example",
+            "phone_number": "5550000"}
+
+
+# name -> (method, build(rng, data, n, client) -> (path, json body or None))
+ROUTES = {
+    "GET /api/users/{id}/": ("GET", lambda rng, d, n, c: (f"/api/users/{rng.choice(d.user_ids)}/", None)),
+    "GET /api/api/users/email/{email}/": ("GET", lambda rng, d, n, c: (
+        f"/api/api/users/email/user{rng.randrange(len(d.user_ids))}@bench.example/", None)),
+    "GET /api/users/": ("GET", lambda rng, d, n, c: ("/api/users/?limit=50", None)),
+    "POST /api/users/": ("POST", lambda rng, d, n, c: ("/api/users/", _user_payload(n))),
+    "POST /api/users/bulk": ("POST", lambda rng, d, n, c: (
+        "/api/users/bulk", [_user_payload(n * 100 + i) for i in range(100)])),
+    "POST /api/users/{id}/": ("POST", lambda rng, d, n, c: _full_update(rng, d, c)),
+    "PATCH /api/users/{id}/": ("PATCH", lambda rng, d, n, c: _partial_update(rng, d)),
+    "GET /api/users/export": ("GET", lambda rng, d, n, c: ("/api/users/export", None)),
+    "GET /api/films/{id}/": ("GET", lambda rng, d, n, c: (f"/api/films/{rng.choice(d.film_ids)}/", None)),
+    "GET /api/films/": ("GET", lambda rng, d, n, c: ("/api/films/?limit=50&sort=-release_year", None)),
+    "GET /api/films/?genre=": ("GET", lambda rng, d, n, c: ("/api/films/?limit=50&genre=drama", None)),
+    "POST /api/films/": ("POST", lambda rng, d, n, c: ("/api/films/", _film_payload(n))),
+    "POST /api/films/bulk": ("POST", lambda rng, d, n, c: (
+        "/api/films/bulk", [_film_payload(n * 100 + i) for i in range(100)])),
+    "GET /api/films/export": ("GET", lambda rng, d, n, c: ("/api/films/export", None)),
+    "GET /api/companies/{id}/": ("GET", lambda rng, d, n, c: (f"/api/companies/{rng.choice(d.company_ids)}/", None)),
+    "GET /api/companies/": ("GET", lambda rng, d, n, c: ("/api/companies/?limit=50", None)),
+    "POST /api/companies/": ("POST", lambda rng, d, n, c: ("/api/companies/", _company_payload(n))),
+    "POST /api/companies/bulk": ("POST", lambda rng, d, n, c: (
+        "/api/companies/bulk", [_company_payload(n * 100 + i) for i in range(100)])),
+    "GET /api/companies/export": ("GET", lambda rng, d, n, c: ("/api/companies/export", None)),
+    # Variants of the routes above that take a different code path
+    "GET /api/users/?ids=": ("GET", lambda rng, d, n, c: (f"/api/users/?ids={_ids(rng, d.user_ids)}", None)),
+    "GET /api/users/?fields=": ("GET", lambda rng, d, n, c: ("/api/users/?limit=50&fields=first_name,last_name", None)),
+    "GET /api/users/{id}/?include=": ("GET", lambda rng, d, n, c: (
+        f"/api/users/{rng.choice(d.user_ids)}/?fields=first_name&include=films", None)),
+    "GET /api/users/export?format=csv": ("GET", lambda rng, d, n, c: ("/api/users/export?format=csv", None)),
+    "GET /api/films/?ids=": ("GET", lambda rng, d, n, c: (f"/api/films/?ids={_ids(rng, d.film_ids)}", None)),
+    "GET /api/films/?fields=": ("GET", lambda rng, d, n, c: ("/api/films/?limit=50&fields=title,release_year", None)),
+    "GET /api/films/?company_id=": ("GET", lambda rng, d, n, c: (
+        f"/api/films/?limit=50&company_id={rng.choice(d.company_ids)}&sort=title", None)),
+    "GET /api/films/?release_year_min=": ("GET", lambda rng, d, n, c: (
+        "/api/films/?limit=50&release_year_min=1990&release_year_max=2000&sort=release_year", None)),
+    "GET /api/films/?budget_min=": ("GET", lambda rng, d, n, c: (
+        "/api/films/?limit=50&budget_min=1000000&budget_max=5000000&sort=-budget", None)),
+    "GET /api/films/search": ("GET", lambda rng, d, n, c: (f"/api/films/search?q=film+{rng.randrange(len(d.film_ids))}", None)),
+    "GET /api/films/export?format=csv": ("GET", lambda rng, d, n, c: ("/api/films/export?format=csv", None)),
+    "GET /api/films/export?release_year_min=": ("GET", lambda rng, d, n, c: (
+        "/api/films/export?release_year_min=1990&release_year_max=2000", None)),
+    "GET /api/films/stats": ("GET", lambda rng, d, n, c: ("/api/films/stats", None)),
+    "GET /api/films/stats?group_by=company_id": ("GET", lambda rng, d, n, c: ("/api/films/stats?group_by=company_id", None)),
+    "GET /api/crew/stats": ("GET", lambda rng, d, n, c: ("/api/crew/stats", None)),
+    "GET /api/companies/?ids=": ("GET", lambda rng, d, n, c: (f"/api/companies/?ids={_ids(rng, d.company_ids)}", None)),
+    "GET /api/companies/?fields=": ("GET", lambda rng, d, n, c: ("/api/companies/?limit=50&fields=name", None)),
+    "GET /api/companies/{id}/stats": ("GET", lambda rng, d, n, c: (
+        f"/api/companies/{rng.choice(d.company_ids)}/stats", None)),
+    "GET /api/companies/export?format=csv": ("GET", lambda rng, d, n, c: ("/api/companies/export?format=csv", None)),
+    "GET /api/users/{id}/collaborators": ("GET", lambda rng, d, n, c: (
+        f"/api/users/{rng.choice(d.user_ids)}/collaborators?depth=2", None)),
+    "GET /api/users/{id}/path/{other_id}": ("GET", lambda rng, d, n, c: (
+        f"/api/users/{rng.choice(d.user_ids)}/path/{rng.choice(d.user_ids)}", None)),
+    "GET /api/ready": ("GET", lambda rng, d, n, c: ("/api/ready", None)),
+    "GET /api/pool/stats": ("GET", lambda rng, d, n, c: ("/api/pool/stats", None)),
+    "GET /api/cache/stats": ("GET", lambda rng, d, n, c: ("/api/cache/stats", None)),
+    "GET /api/coalesce/stats": ("GET", lambda rng, d, n, c: ("/api/coalesce/stats", None)),
+    "GET /metrics": ("GET", lambda rng, d, n, c: ("/metrics", None)),
+}
+# Whole-table routes are slow by design; keep them from dominating the run
+ROUTE_REQUESTS = {name: 5 for name in ROUTES if "/export" in name}
+
+
+def _ids(rng, ids: list[int], count: int = 50) -> str:
+    return ",".join(map(str, rng.sample(ids, min(count, len(ids)))))
+
+
+def _full_update(rng, data: Dataset, client):
+    id = rng.choice(data.user_ids)
+    user = client.get(f"/api/users/{id}/").json()
+    user["minimun_fee"] = rng.randrange(1, 10_000)
+    return f"/api/users/{id}/", user
+
+
+def _partial_update(rng, data: Dataset):
+    id = rng.choice(data.user_ids)
+    return f"/api/users/{id}/", {"id": id, "minimun_fee": rng.randrange(1, 10_000)}
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: list[float], errors: int, wall: float, statements: list[int] | None) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "statements_per_request": round(sum(statements) / len(statements), 2) if statements else None,
+    }
+
+
+def run_inprocess(data: Dataset, requests: int, seed: int, routes: list[str]) -> dict:
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    from simplecrud import database
+    from simplecrud.main import app
+
+    counter = {"n": 0}
+
+    def count(*args):
+        counter["n"] += 1
+
+    # Every engine the app builds (sync, async or replica), so DB_ASYNC=1 runs are counted too
+    database.on_engine(lambda engine: event.listen(engine, "before_cursor_execute", count))
+    # Count a failing route as errors instead of aborting the whole run. Entering the client runs
+    # the app's startup, like a served worker
+    results = {}
+    with TestClient(app, raise_server_exceptions=False) as client:
+        for name in routes:
+            method, build = ROUTES[name]
+            rng = random.Random(f"{seed}:{name}")
+            latencies, statements, errors = [], [], 0
+            started = time.perf_counter()
+            for n in range(ROUTE_REQUESTS.get(name, requests)):
+                path, body = build(rng, data, n, client)
+                counter["n"] = 0
+                t0 = time.perf_counter()
+                response = client.request(method, path, json=body)
+                latencies.append(time.perf_counter() - t0)
+                statements.append(counter["n"])
+                errors += response.status_code >= 400
+            results[name] = summarize(latencies, errors, time.perf_counter() - started, statements)
+            print(f"{name:<40} {results[name]}")
+    return results
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_uvicorn(data: Dataset, requests: int, seed: int, routes: list[str], concurrency: int, workers: int) -> dict:
+    import httpx
+
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "simplecrud.main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        env=os.environ.copy(),
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"{base_url}/docs", timeout=1)
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        results = {}
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            for name in routes:
+                method, build = ROUTES[name]
+                rng = random.Random(f"{seed}:{name}")
+                # Build every request up front so only the HTTP calls are timed
+                prepared = [build(rng, data, n, client) for n in range(ROUTE_REQUESTS.get(name, requests))]
+
+                def call(request):
+                    path, body = request
+                    t0 = time.perf_counter()
+                    response = client.request(method, path, json=body)
+                    return time.perf_counter() - t0, response.status_code >= 400
+
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    outcomes = list(pool.map(call, prepared))
+                wall = time.perf_counter() - started
+                results[name] = summarize([o[0] for o in outcomes], sum(o[1] for o in outcomes), wall, None)
+                print(f"{name:<40} {results[name]}")
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for name, current in results["routes"].items():
+        before = baseline.get("routes", {}).get(name)
+        if not before:
+            continue
+        if before["p95_ms"] and current["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {current['p95_ms']}ms")
+        if before.get("statements_per_request") is not None and current.get("statements_per_request") is not None \
+                and current["statements_per_request"] > before["statements_per_request"]:
+            regressions.append(f"{name}: statements {before['statements_per_request']} -> {current['statements_per_request']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--db-url", default=os.environ.get("BENCH_DB_URL"))
+    parser.add_argument("--users", type=int, default=DatasetSpec.users)
+    parser.add_argument("--films", type=int, default=DatasetSpec.films)
+    parser.add_argument("--companies", type=int, default=DatasetSpec.companies)
+    parser.add_argument("--crew-per-film", type=int, default=DatasetSpec.crew_per_film)
+    parser.add_argument("--staff-per-company", type=int, default=DatasetSpec.staff_per_company)
+    parser.add_argument("--seed", type=int, default=DatasetSpec.seed)
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--route", action="append", choices=list(ROUTES), help="repeatable; default all routes")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads (uvicorn target)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (uvicorn target)")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    db_url = args.db_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='simplecrud-bench-'), 'bench.db')}"
+    # simplecrud reads its settings at import time, so configure it before importing
+    os.environ["DB_URL"] = db_url
+    from simplecrud.database import get_engine
+    from benchmarks.datagen import generate
+
+    engine = get_engine()
+    spec = DatasetSpec(args.users, args.films, args.companies, args.crew_per_film, args.staff_per_company, args.seed)
+    started = time.perf_counter()
+    data = generate(engine, spec)
+    print(f"Generated {spec} in {time.perf_counter() - started:.1f}s on {engine.dialect.name}")
+    engine.dispose()
+
+    routes = args.route or list(ROUTES)
+    if args.target == "inprocess":
+        route_results = run_inprocess(data, args.requests, args.seed, routes)
+    else:
+        route_results = run_uvicorn(data, args.requests, args.seed, routes, args.concurrency, args.workers)
+
+    results = {
+        "meta": {
+            "target": args.target,
+            "database": engine.dialect.name,
+            "dataset": spec.__dict__,
+            "requests_per_route": args.requests,
+            "python": platform.python_version(),
+            "env": {k: v for k, v in os.environ.items() if k.startswith(("DB_", "CACHE_", "FAST_")) and "PASS" not in k and "URL" not in k},
+        },
+        "routes": route_results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
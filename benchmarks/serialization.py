@@ -0,0 +1,73 @@
+"""Micro-benchmark: response_model serialization vs the prebuilt fast path.
+
+    python -m benchmarks.serialization [--users 100] [--films 10] [--companies 3] [--repeat 20]
+
+Builds transient ORM rows (no database needed) shaped like a page of the list
+endpoints and times both ways of turning them into a JSON body.
+"""
+import argparse
+import json
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from simplecrud import models, schemas, serializers
+
+
+def build_users(users: int, films: int, companies: int) -> list[models.User]:
+    rows = []
+    for u in range(users):
+        user = models.User(id=u + 1, first_name=f"First{u}", last_name=f"Last{u}", email=f"user{u}@example.com", minimun_fee=100 + u,
+                           version=1)
+        user.films = [
+            models.FilmCrewMembers(role="director", film=models.Film(
+                id=u * films + f + 1, title=f"Film {u}-{f}", description="A film " * 20, budget=1_000_000 + f,
+                release_year=1990 + f % 30, genres=["drama", "comedy"], company_id=None))
+            for f in range(films)
+        ]
+        user.companies = [
+            models.CompanyStaff(role="member", company=models.Company(
+                id=u * companies + c + 1, name=f"Company {u}-{c}", contact_email_address=f"c{c}@example.com", phone_number="5550100"))
+            for c in range(companies)
+        ]
+        rows.append(user)
+    return rows
+
+
+def current_path(schema, rows) -> bytes:
+    # What FastAPI does with response_model: validate from attributes, encode, json.dumps
+    adapter = TypeAdapter(list[schema])
+    value = adapter.validate_python(rows, from_attributes=True)
+    content = jsonable_encoder(adapter.dump_python(value, mode="json", by_alias=False))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def fast_path(schema, rows) -> bytes:
+    serialize = serializers.serializer(schema)
+    return serializers.dumps([serialize(row) for row in rows])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--films", type=int, default=10)
+    parser.add_argument("--companies", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = build_users(args.users, args.films, args.companies)
+    assert json.loads(current_path(schemas.UserSchema, rows)) == json.loads(fast_path(schemas.UserSchema, rows))
+
+    encoder = "orjson" if serializers.orjson is not None else "json"
+    print(f"UserSchema list of {args.users} users x {args.films} films x {args.companies} companies ({encoder})")
+    results = {}
+    for name, fn in (("response_model", current_path), ("fast", fast_path)):
+        best = min(timeit.repeat(lambda: fn(schemas.UserSchema, rows), number=1, repeat=args.repeat))
+        results[name] = best
+        print(f"  {name:<15} {best * 1000:8.2f} ms")
+    print(f"  speedup         {results['response_model'] / results['fast']:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
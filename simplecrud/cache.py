@@ -0,0 +1,122 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from decouple import config
+
+# Per-process cache of serialized detail responses. Each worker invalidates only its own
+# copy on writes, so with several workers a peer's write can be visible up to CACHE_TTL late.
+CACHE_ENABLED = config("CACHE_ENABLED", default=False, cast=bool)
+CACHE_TTL = config("CACHE_TTL", default=30.0, cast=float)
+CACHE_MAX_BYTES = config("CACHE_MAX_BYTES", default=64 * 1024 * 1024, cast=int)
+
+
+def etag_for(body: bytes, version: int | None = None) -> str:
+    # Strong validator: identical bytes, identical tag. Versioned rows (users) lead with
+    # their version so the same tag can go back as If-Match on a write (see etag_version)
+    digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+    return f'"{digest}"' if version is None else f'"v{version}-{digest}"'
+
+
+def etag_version(tag: str) -> int | None:
+    # The row version an ETag from etag_for was made at; also takes a bare "3". None for weak
+    # tags: If-Match compares strongly (RFC 9110 13.1.1), so W/"v3" never matches
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        return None
+    value = tag.strip('"').split("-", 1)[0]
+    value = value.removeprefix("v")
+    return int(value) if value.isdigit() else None
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+class ResponseCache:
+    """LRU + TTL cache of (body, etag) bounded by the total size of the bodies."""
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, ttl: float = CACHE_TTL, enabled: bool = CACHE_ENABLED):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        # Bumped on every invalidation; a fill started before a write is discarded
+        self._epoch = 0
+        self._invalidated_at = time.monotonic()
+        self.hits = self.misses = self.evictions = 0
+
+    def epoch(self) -> int:
+        return self._epoch
+
+    def quiet_for(self) -> float:
+        # Seconds since this worker last saw a write
+        return time.monotonic() - self._invalidated_at
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def set(self, key, body: bytes, etag: str, epoch: int):
+        if not self.enabled or len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if epoch != self._epoch:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, body, etag)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, keys):
+        with self._lock:
+            self._epoch += 1
+            self._invalidated_at = time.monotonic()
+            for key in keys:
+                if key in self._entries:
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._invalidated_at = time.monotonic()
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _drop(self, key):
+        _, body, _ = self._entries.pop(key)
+        self._size -= len(body)
+
+
+response_cache = ResponseCache()
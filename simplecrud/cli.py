@@ -0,0 +1,60 @@
+import argparse
+
+from simplecrud import models, stats
+from simplecrud.database import get_engine
+from simplecrud.importer import KINDS, import_file
+from simplecrud.migrate_genres import backfill
+
+
+def create_schema_command(args):
+    # The app never creates tables itself; run this once per database (and after adding models)
+    models.Base.metadata.create_all(bind=get_engine())
+    print("Created any missing tables and indexes")
+
+
+def import_command(args):
+    models.Base.metadata.create_all(bind=get_engine())
+    import_file(args.kind, args.path, fmt=args.format, batch_size=args.batch_size, restart=args.restart)
+
+
+def migrate_genres_command(args):
+    models.Base.metadata.create_all(bind=get_engine())
+    backfill(args.batch_size, args.after_id)
+
+
+def rebuild_stats_command(args):
+    models.Base.metadata.create_all(bind=get_engine())
+    with get_engine().begin() as conn:
+        stats.rebuild(conn)
+    print("Rebuilt company_stats, release_year_stats and crew_role_stats")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="simplecrud")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("create-schema", help="Create missing tables and indexes")
+    command.set_defaults(handler=create_schema_command)
+
+    command = commands.add_parser("import", help="Stream a CSV/NDJSON dataset into the database")
+    command.add_argument("kind", choices=list(KINDS), help="load users/companies before films, links last")
+    command.add_argument("path")
+    command.add_argument("--format", choices=["csv", "ndjson"], help="defaults to the file extension")
+    command.add_argument("--batch-size", type=int, default=1000)
+    command.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from line 1")
+    command.set_defaults(handler=import_command)
+
+    command = commands.add_parser("migrate-genres", help="Backfill film_genre from the legacy pickled column")
+    command.add_argument("--batch-size", type=int, default=1000)
+    command.add_argument("--after-id", type=int, default=0)
+    command.set_defaults(handler=migrate_genres_command)
+
+    command = commands.add_parser("rebuild-stats", help="Recompute the summary tables behind the /stats endpoints")
+    command.set_defaults(handler=rebuild_stats_command)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
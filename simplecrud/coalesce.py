@@ -0,0 +1,91 @@
+import asyncio
+from collections import OrderedDict
+
+from decouple import config
+
+from .cache import response_cache
+
+# Identical GETs that arrive while one is already being answered wait for that one and
+# share its rendered body, instead of each running the same queries. Nothing is kept once
+# the first request finishes, so unlike the response cache this never serves old data:
+# a request only joins a flight that started after the last write this worker saw. Every
+# write path moves response_cache's epoch for that, bulk creates and imports included.
+COALESCE_ENABLED = config("COALESCE_ENABLED", default=True, cast=bool)
+# How many hot keys /api/coalesce/stats remembers
+COALESCE_TRACKED_KEYS = 1000
+
+
+class Flight:
+    __slots__ = ("future", "epoch", "waiters")
+
+    def __init__(self, epoch: int):
+        self.future = asyncio.get_running_loop().create_future()
+        self.epoch = epoch
+        self.waiters = 0
+
+
+class Flights:
+    """Single-flight by key for coroutines on one event loop (one per worker)."""
+
+    def __init__(self, tracked: int = COALESCE_TRACKED_KEYS):
+        self._flights = {}
+        self.tracked = tracked
+        self.leaders = 0
+        self.followers = 0
+        self._peaks = OrderedDict()  # key -> (most requests sharing one flight, requests that waited)
+
+    async def run(self, key, work):
+        while True:
+            flight = self._flights.get(key)
+            if flight is None or flight.epoch != response_cache.epoch():
+                return await self._lead(key, work)
+            flight.waiters += 1
+            self.followers += 1
+            try:
+                return await asyncio.shield(flight.future)
+            except asyncio.CancelledError:
+                if not flight.future.cancelled():
+                    raise
+                # The request doing the work went away; someone else has to do it
+
+    async def _lead(self, key, work):
+        flight = self._flights[key] = Flight(response_cache.epoch())
+        self.leaders += 1
+        try:
+            result = await work()
+        except Exception as e:
+            flight.future.set_exception(e)
+            # Marks the exception as retrieved, so asyncio doesn't log it when nobody was waiting
+            flight.future.exception()
+            raise
+        except BaseException:
+            flight.future.cancel()
+            raise
+        else:
+            flight.future.set_result(result)
+            return result
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if flight.waiters:
+                self._record(key, flight.waiters)
+
+    def _record(self, key, waiters: int):
+        peak, total = self._peaks.pop(key, (0, 0))
+        self._peaks[key] = (max(peak, waiters + 1), total + waiters)
+        if len(self._peaks) > self.tracked:
+            self._peaks.popitem(last=False)
+
+    def stats(self, top: int = 20) -> dict:
+        hot = sorted(self._peaks.items(), key=lambda item: item[1], reverse=True)[:top]
+        return {
+            "enabled": COALESCE_ENABLED,
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "hot_keys": [{"key": "?".join(filter(None, key)), "peak_concurrency": peak, "coalesced": total}
+                         for key, (peak, total) in hot],
+        }
+
+
+flights = Flights()
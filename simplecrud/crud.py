@@ -1,24 +1,224 @@
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, load_only, selectinload
+from sqlalchemy.orm.exc import StaleDataError
+from starlette.concurrency import run_in_threadpool
 
 from simplecrud.models import Company
-from . import models, schemas
-
-def get_user(db: Session, id: int):
+from . import graph, models, profiling, schemas, search, stats
+from .cache import response_cache
+from .pagination import Page, PaginationError, paginate
+
+# Public sort keys for the list endpoints, each backed by a (column, id) index
+USER_SORTS = {"id": models.User.id, "last_name": models.User.last_name}
+FILM_SORTS = {
+    "id": models.Film.id,
+    "title": models.Film.title,
+    "budget": models.Film.budget,
+    "release_year": models.Film.release_year,
+}
+COMPANY_SORTS = {"id": models.Company.id, "name": models.Company.name}
+# Keeps IN lists under SQLite's bound parameter limit; Postgres doesn't mind either way
+IN_CHUNK_SIZE = 500
+# Most ids one ?ids= request may ask for, i.e. a single IN query
+MAX_BATCH_IDS = IN_CHUNK_SIZE
+
+# Loading plans: every relationship the response schemas touch is loaded up front.
+# Collections use selectinload (one extra IN query each, no row multiplication and
+# no LIMIT subquery); the many-to-one hop through the association row is joined
+# onto that same query. A read therefore costs 1 + number of collections queries.
+USER_LOAD = (
+    selectinload(models.User.films).joinedload(models.FilmCrewMembers.film).selectinload(models.Film.genre_rows),
+    selectinload(models.User.companies).joinedload(models.CompanyStaff.company),
+)
+FILM_LOAD = (
+    selectinload(models.Film.genre_rows),
+    selectinload(models.Film.crew_members).joinedload(models.FilmCrewMembers.user),
+)
+COMPANY_LOAD = (
+    selectinload(models.Company.films).selectinload(models.Film.genre_rows),
+    selectinload(models.Company.staff).joinedload(models.CompanyStaff.user),
+)
+
+# ?include= names per entity and the loading plan entry each one needs (see sparse_load)
+SPARSE_INCLUDES = {
+    "users": {"films": USER_LOAD[0], "companies": USER_LOAD[1]},
+    "films": {"crew_members": FILM_LOAD[1]},
+    "companies": {"films": COMPANY_LOAD[0], "staff": COMPANY_LOAD[1]},
+}
+SPARSE_MODELS = {"users": models.User, "films": models.Film, "companies": models.Company}
+
+
+def sparse_load(kind: str, fields: set[str], include: set[str]) -> tuple:
+    # Loader options for a sparse read: only these columns, only these relationships.
+    # Anything left out is neither selected nor serialized.
+    model = SPARSE_MODELS[kind]
+    options = [load_only(*[getattr(model, name) for name in fields if name in model.__table__.c])]
+    if model is models.Film and "genres" in fields:
+        options.append(selectinload(models.Film.genre_rows))
+    return (*options, *(SPARSE_INCLUDES[kind][name] for name in include))
+
+
+async def run(db: Session | AsyncSession, fn, *args, **kwargs):
+    # Async version of any function below. On an AsyncSession the sync body runs
+    # through run_sync, i.e. in SQLAlchemy's greenlet bridge on the event loop with
+    # a non-blocking driver; on a plain Session it goes to the threadpool as before.
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(profiling.wrap(fn), db, *args, **kwargs)
+
+
+def unique_violation(error: IntegrityError) -> str | None:
+    # Which of models.UNIQUE_CONSTRAINTS a failed insert ran into, if any
+    orig = error.orig
+    name = getattr(getattr(orig, "diag", None), "constraint_name", None)  # psycopg2
+    name = name or getattr(orig.__cause__, "constraint_name", None)  # asyncpg
+    message = str(orig)
+    for constraint, sqlite_key in models.UNIQUE_CONSTRAINTS.items():
+        if name == constraint or (name is None and sqlite_key in message):
+            return constraint
+    return None
+
+
+# Unique columns whose violation can come from a list of nested films or companies
+UNIQUE_KEYS = {
+    "uq_films_title": (models.Film.title, models.Film.id),
+    "uq_companies_name": (models.Company.name, models.Company.id),
+}
+
+
+def taken_values(db: Session, constraint: str, candidates: list[tuple]) -> list:
+    """Which of the (value, own id or None) candidates ran into `constraint`: held by another
+    row, or given twice. Only run once a write has failed, so the common path stays one trip."""
+    db.rollback()
+    column, id_column = UNIQUE_KEYS[constraint]
+    values = list({value for value, _ in candidates})
+    holders = {}
+    for i in range(0, len(values), IN_CHUNK_SIZE):
+        holders.update(db.execute(select(column, id_column).where(column.in_(values[i:i + IN_CHUNK_SIZE]))).all())
+    given = [value for value, _ in candidates]
+    return sorted({value for value, id in candidates
+                   if holders.get(value, id) != id or given.count(value) > 1})
+
+
+class Loader:
+    """Batches lookups by primary key within one request (see loader()).
+
+    Ids are queued with prime(); the next get()/get_many() fetches everything queued in
+    one IN query (per IN_CHUNK_SIZE ids) with the loading plan applied. Rows and misses
+    are remembered until the session commits or rolls back, so asking again for an id
+    costs nothing. get_user/get_film/get_company and the ?ids= fetches all go through it.
+    """
+
+    def __init__(self, db: Session, model, load: tuple = ()):
+        self.db = db
+        self.model = model
+        self.load = load
+        self._pending = set()
+        self._found = {}
+        self._missing = set()
+
+    def prime(self, ids):
+        self._pending.update(id for id in ids if id not in self._found and id not in self._missing)
+
+    def _flush(self):
+        pending = sorted(self._pending)
+        self._pending.clear()
+        for i in range(0, len(pending), IN_CHUNK_SIZE):
+            stmt = select(self.model).options(*self.load).where(self.model.id.in_(pending[i:i + IN_CHUNK_SIZE]))
+            self._found.update((obj.id, obj) for obj in self.db.scalars(stmt))
+        self._missing.update(id for id in pending if id not in self._found)
+
+    def get(self, id: int):
+        self.prime([id])
+        if self._pending:
+            self._flush()
+        return self._found.get(id)
+
+    def get_many(self, ids) -> list:
+        # In the order asked for, duplicates and missing ids dropped
+        self.prime(ids)
+        if self._pending:
+            self._flush()
+        return [self._found[id] for id in dict.fromkeys(ids) if id in self._found]
+
+
+def loader(db: Session, model, load: tuple = ()) -> Loader:
+    # One Loader per session, model and loading plan; sessions live for a single request
+    loaders = db.info.setdefault("loaders", {})
+    if (model, load) not in loaders:
+        loaders[model, load] = Loader(db, model, load)
+    return loaders[model, load]
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def forget_loaded(session):
+    # A write can change what the next lookup should return, e.g. the user an update hands back
+    session.info.pop("loaders", None)
+
+
+def get_user(db: Session, id: int, load: tuple = USER_LOAD):
     # return db.query(models.User).filter(models.User.id == id).first()
-    return db.query(models.User).options(joinedload(models.User.films)).options(joinedload(models.User.companies)).where(models.User.id == id).first()
+    return loader(db, models.User, load).get(id)
 
 
 def get_user_by_email(db: Session, email: str):
     # return db.query(models.User).filter(models.User.email == email).first()   # 0.065
-    return db.query(models.User).options(joinedload(models.User.films)).options(joinedload(models.User.companies)).where(models.User.email == email).first()    # 0.068
+    return db.query(models.User).options(*USER_LOAD).where(func.lower(models.User.email) == email.lower()).first()
+
+
+def get_users(db: Session, skip: int = 0, limit: int = 100, after: str | None = None, sort: str = "id",
+              load: tuple = USER_LOAD) -> Page:
+    query = db.query(models.User).options(*load)
+    return paginate(query, USER_SORTS, sort=sort, after=after, limit=limit, skip=skip)
+
+
+def get_users_by_ids(db: Session, ids: list[int], load: tuple = USER_LOAD) -> Page:
+    return Page(loader(db, models.User, load).get_many(ids), None)
+
 
+def _names(db: Session, id_column, name_columns, ids) -> dict:
+    ids = list(ids)
+    found = {}
+    for i in range(0, len(ids), IN_CHUNK_SIZE):
+        found.update((row[0], row) for row in db.execute(
+            select(id_column, *name_columns).where(id_column.in_(ids[i:i + IN_CHUNK_SIZE]))))
+    return found
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.User).options(joinedload(models.User.films)).options(joinedload(models.User.companies)).offset(skip).limit(limit).all()
 
+def _user_exists(db: Session, id: int) -> bool:
+    return db.scalar(select(models.User.id).where(models.User.id == id)) is not None
 
-def get_users_by_ids(db: Session, ids: list, skip: int = 0, limit: int = 100):
-    return db.query(models.User).filter(models.User.id__in == ids).offset(skip).limit(limit).all()
+
+def get_collaborators(db: Session, id: int, depth: int = 1, via: tuple = ("film", "company"), roles: tuple = (),
+                      limit: int = 100):
+    if not _user_exists(db, id):
+        return None
+    found = graph.collaborators(db, id, depth, via, roles, limit)
+    users = _names(db, models.User.id, (models.User.first_name, models.User.last_name), [user for user, _ in found])
+    return [{"id": user, "first_name": users[user].first_name, "last_name": users[user].last_name,
+             "distance": distance} for user, distance in found]
+
+
+def get_collaboration_path(db: Session, id: int, other_id: int, max_depth: int = graph.MAX_PATH_DEPTH,
+                           via: tuple = ("film", "company"), roles: tuple = ()):
+    # None when either user doesn't exist, [] when they aren't connected within max_depth
+    if not (_user_exists(db, id) and _user_exists(db, other_id)):
+        return None
+    path = graph.shortest_path(db, id, other_id, max_depth, via, roles)
+    if path is None:
+        return []
+    users = _names(db, models.User.id, (models.User.first_name, models.User.last_name), [user for user, _, _ in path])
+    hubs = {
+        "film": _names(db, models.Film.id, (models.Film.title,), [hub for _, kind, hub in path if kind == "film"]),
+        "company": _names(db, models.Company.id, (models.Company.name,),
+                          [hub for _, kind, hub in path if kind == "company"]),
+    }
+    return [{"id": user, "first_name": users[user].first_name, "last_name": users[user].last_name,
+             "via": kind, "via_id": hub, "via_name": hubs[kind][hub][1] if kind else None}
+            for user, kind, hub in path]
 
 
 def create_user(db: Session, user: schemas.UserCreateSchema):
@@ -46,7 +246,6 @@ def create_user(db: Session, user: schemas.UserCreateSchema):
         db.add_all(films)
         db.flush()
 
-    print('Film Ids: ', list(map(lambda x: x.id, films)))
     crew_members = []
     for i, film in enumerate(films):
         crew_members.append(
@@ -86,137 +285,222 @@ def create_user(db: Session, user: schemas.UserCreateSchema):
         db.add_all(company_staff)
         db.flush()
     db.commit()
-    db.refresh(db_user)
-    return db_user
-
-
-def update_user_post(db: Session, user: schemas.UserUpdateSchema):
-    userUpdate = user.model_dump()
-    userUpdate.pop('films', None)
-    userUpdate.pop('companies', None)
-    
-    db.query(models.User).filter(models.User.id == user.id).update(userUpdate)
-    db.flush()
-    current_film_ids = []
-    films = []
+    response_cache.invalidate({("user", db_user.id)})
+    return get_user(db, db_user.id)
+
+
+FILM_FIELDS = {"title", "description", "budget", "release_year", "company_id"}
+COMPANY_FIELDS = {"name", "contact_email_address", "phone_number"}
+
+
+def _assign(obj, values: dict) -> bool:
+    # Only touch attributes whose value differs, so the flush UPDATEs changed columns only
+    changed = False
+    for key, value in values.items():
+        if getattr(obj, key) != value:
+            setattr(obj, key, value)
+            changed = True
+    return changed
+
+
+def _film_values(film) -> dict:
+    values = film.model_dump(include=FILM_FIELDS)
+    # company_id defaults to 0 in the schema, which is "no company" rather than a row
+    values["company_id"] = values["company_id"] or None
+    return values
+
+
+def _user_cache_keys(db_user: models.User) -> set:
+    # Everything whose detail response embeds this user or its links
+    keys = {("user", db_user.id)}
+    for link in db_user.films:
+        keys.add(("film", link.film_id))
+        if link.film.company_id:
+            keys.add(("company", link.film.company_id))
+    keys.update(("company", link.company_id) for link in db_user.companies)
+    return keys
+
+
+def _linked_user_keys(db: Session, films: set, companies: set) -> set:
+    # ("user", id) for everyone crewing one of these films or staffing one of these companies,
+    # i.e. the other user details that embed them
+    keys = set()
+    for column, ids in ((models.FilmCrewMembers.film_id, list(films)), (models.CompanyStaff.company_id, list(companies))):
+        user_id = column.class_.user_id
+        for i in range(0, len(ids), IN_CHUNK_SIZE):
+            keys.update(("user", id) for id in db.scalars(select(user_id).where(column.in_(ids[i:i + IN_CHUNK_SIZE]))))
+    return keys
+
+
+def update_user_post(db: Session, user: schemas.UserUpdateSchema, db_user: models.User | None = None):
+    # Diffs the payload against the user as loaded by main.update_user (USER_LOAD). The flush
+    # then batches per table: changed columns only, one executemany per column set, one
+    # multi-row INSERT for new films/companies and their links, one DELETE for dropped links.
+    db_user = db_user or get_user(db, user.id)
+    stale = _user_cache_keys(db_user)
+    _assign(db_user, user.model_dump(include={"first_name", "last_name", "minimun_fee"}))
+
+    # Shared films/companies edited here, whose other users' cached details embed them too
+    edited_films, edited_companies = set(), set()
+    film_links = {link.film_id: link for link in db_user.films}
+    kept = set()
     for obj in user.films:
         if obj.film.id:
             # Updating the exisiting Linked Model for the m2m
-            db.query(models.Film).filter(models.Film.id == obj.film.id).update(obj.film.dict())
-            current_film_ids.append(obj.film.id)
-            db.query(models.FilmCrewMembers).filter(models.FilmCrewMembers.film_id == obj.film.id, models.FilmCrewMembers.user_id == user.id).update({"role": obj.role})
+            link = film_links[obj.film.id]
+            if _assign(link.film, _film_values(obj.film)):
+                edited_films.add(obj.film.id)
+            if set(link.film.genres) != set(obj.film.genres or []):
+                link.film.genres = obj.film.genres
+                edited_films.add(obj.film.id)
+            _assign(link, {"role": obj.role})
+            kept.add(obj.film.id)
         else:
-            # Rebuilding list instance of the newly added link models in order to retain the list order
-            film = models.Film(
-                title=obj.film.title,
-                description=obj.film.description,
-                budget=obj.film.budget,
-                release_year=obj.film.release_year,
-                genres=obj.film.genres
-            )
-            films.append({"role": obj.role, "film": film})
-    
-    # If there are new films added (Save them)
-    if len(films) > 0:
-        new_films = list(map(lambda x: x["film"], films))
-        db.add_all(new_films)
-        db.flush()
-        crew_members = []
-        for i, film in enumerate(new_films):
-            crew_members.append(
-                models.FilmCrewMembers(
-                    user_id=user.id,
-                    film_id=film.id,
-                    role=films[i]["role"]
-                )
-            )
-        db.add_all(crew_members)
-        db.flush() 
-        current_film_ids += list(map(lambda x: x.film_id, crew_members))
-    
-    print('===> ', current_film_ids)
-    db.flush()
-    query = db.query(models.FilmCrewMembers).filter(models.FilmCrewMembers.user_id==user.id, ~models.FilmCrewMembers.film_id.in_(current_film_ids))
-    query.delete(synchronize_session=False)
-    db.flush()
-    
-    current_company_ids = []
-    companies = []
+            film = models.Film(**_film_values(obj.film), genres=obj.film.genres)
+            db_user.films.append(models.FilmCrewMembers(film=film, role=obj.role))
+    for film_id, link in film_links.items():
+        if film_id not in kept:
+            db_user.films.remove(link)
+            db.delete(link)
+
+    company_links = {link.company_id: link for link in db_user.companies}
+    kept = set()
     for obj in user.companies:
         if obj.company.id:
             # Updating the exisiting Linked Model for the m2m
-            db.query(models.Company).filter(models.Company.id == obj.company.id).update(obj.company.dict())
-            current_company_ids.append(obj.company.id)
-            db.query(models.CompanyStaff).filter(models.CompanyStaff.company_id == obj.company.id, models.CompanyStaff.user_id == user.id).update({"role": obj.role})
+            link = company_links[obj.company.id]
+            if _assign(link.company, obj.company.model_dump(include=COMPANY_FIELDS)):
+                edited_companies.add(obj.company.id)
+            _assign(link, {"role": obj.role})
+            kept.add(obj.company.id)
         else:
-            # Rebuilding list instance of the newly added link models in order to retain the list order
-            company = models.Company(
-                name=obj.company.name,
-                contact_email_address=obj.company.contact_email_address,
-                phone_number=obj.company.phone_number
-            )
-            companies.append({"role": obj.role, "company": company})
-    
-    # If there are new companies added (Save them)
-    if len(companies) > 0:
-        new_companies = list(map(lambda x: x["company"], companies))
-        db.add_all(new_companies)
-        db.flush()
-        staff = []
-        for i, company in enumerate(new_companies):
-            staff.append(
-                models.CompanyStaff(
-                    user_id=user.id,
-                    company_id=company.id,
-                    role=companies[i]["role"]
-                )
-            )
-        db.add_all(staff)
-        db.flush()
-        current_company_ids += list(map(lambda x: x.company_id, staff))
-
-    query = db.query(models.CompanyStaff).filter(models.CompanyStaff.user_id==user.id, ~models.CompanyStaff.company_id.in_(current_company_ids))
-    query.delete(synchronize_session=False)
-    
-    db.commit()
-    return db.query(models.User).get(user.id)
-        
-
-def update_user_put(db: Session, user: schemas.UserUpdatePartial):
-    # TODO: Implement Partial Update
-    userUpdate = user.model_dump()
-    print('User 1: ', userUpdate)
-    userUpdate.pop('films', None)
-    userUpdate.pop('companies', None)
-    
-    print('User 2: ', userUpdate)
-    db.query(models.User).filter(models.User.id == user.id).update(userUpdate)
-    db.flush()
-    return db.query(models.User).get(user.id)
-        
+            company = models.Company(**obj.company.model_dump(include=COMPANY_FIELDS))
+            db_user.companies.append(models.CompanyStaff(company=company, role=obj.role))
+    for company_id, link in company_links.items():
+        if company_id not in kept:
+            db_user.companies.remove(link)
+            db.delete(link)
+
+    try:
+        if response_cache.enabled and (edited_films or edited_companies):
+            # Autoflushes, hence inside the try. Anyone linked after this read invalidates their own entry
+            stale |= _linked_user_keys(db, edited_films, edited_companies)
+        db.commit()
+    except (IntegrityError, StaleDataError):
+        # Leaves the session usable; nothing of this update was written
+        db.rollback()
+        raise
+    response_cache.invalidate(stale | _user_cache_keys(db_user))
+    # Sessions don't expire on commit, so the in-memory graph already is the response
+    return db_user
         
-    # query.get() returns the models.User
-    # db_user = db.query(models.User).get(user.id).instance_update(user)
-    # db.commit()
-    # db.refresh(db_user)
-    # return db_user
-
 
-
-def get_film(db: Session, id: int):
+USER_PATCH_FIELDS = {"first_name", "last_name", "minimun_fee"}
+
+
+def patch_user(db: Session, id: int, values: dict, version: int | None = None):
+    """Writes just `values` (and the version bump) in one UPDATE ... RETURNING.
+
+    With `version` the row is only updated if it is still at that version. Returns the
+    updated row, or None when nothing matched (see user_version for why).
+    """
+    user = models.User
+    columns = [user.__table__.c[name] for name in schemas.User.model_fields]
+    condition = user.id == id if version is None else (user.id == id) & (user.version == version)
+    if not values:
+        # Nothing to write; still answers (and checks If-Match) like an update would
+        return db.execute(select(*columns).where(condition)).mappings().first()
+    stmt = (
+        update(user).where(condition).values(**values, version=user.version + 1).returning(*columns)
+        .execution_options(synchronize_session=False)
+    )
+    row = db.execute(stmt).mappings().first()
+    if row is not None:
+        keys = {("user", id)}
+        if response_cache.enabled:
+            # Film and company details embed the user; only worth a query when something may be cached
+            keys.update(("film", film_id) for film_id in db.scalars(
+                select(models.FilmCrewMembers.film_id).where(models.FilmCrewMembers.user_id == id)))
+            keys.update(("company", company_id) for company_id in db.scalars(
+                select(models.CompanyStaff.company_id).where(models.CompanyStaff.user_id == id)))
+        db.commit()
+        response_cache.invalidate(keys)
+    return row
+
+
+def user_version(db: Session, id: int) -> int | None:
+    return db.scalar(select(models.User.version).where(models.User.id == id))
+
+
+def get_film(db: Session, id: int, load: tuple = FILM_LOAD):
     # return db.query(models.Film).filter(models.Film.id == id).first()
-    return db.query(models.Film).options(joinedload(models.Film.crew_members)).where(models.Film.id == id).first()
+    return loader(db, models.Film, load).get(id)
 
 def get_film_title(db: Session, title: str):
     return db.query(models.Film).filter(models.Film.title == title).first()
     
-def get_films(db: Session, skip: int = 0, limit: int = 100):
-    # return db.query(models.Film).offset(skip).limit(limit).all()
-    return db.query(models.Film).options(joinedload(models.Film.crew_members)).all()
-
-
-def get_films_by_ids(db: Session, ids: list, skip: int = 0, limit: int = 100):
-    return db.query(models.Film).filter(models.Film.id.in_(ids)).offset(skip).limit(limit).all()
+def film_sorts(filters: dict) -> set[str]:
+    """The sorts an index can serve together with these films list filters.
+
+    A range is read off its (column, id) index, or (company_id, column, id) with a company,
+    so the page comes out in that column's order. Without ranges a company's films can be
+    read in any order through (company_id, sort column, id), and a genre alone in id order
+    straight from (genre_id, film_id). Anything else would sort every match per page.
+    """
+    ranges = {column for column in ("release_year", "budget") if {f"{column}_min", f"{column}_max"} & filters.keys()}
+    if ranges:
+        return ranges
+    if "genre" in filters and "company_id" not in filters:
+        return {"id"}
+    return set(FILM_SORTS)
+
+
+def default_film_sort(filters: dict) -> str:
+    # What the films list sorts by when the client doesn't ask: id, unless a range filter
+    # only leaves that range's column (see film_sorts)
+    allowed = film_sorts(filters)
+    return "id" if "id" in allowed else min(allowed)
+
+
+def filter_films(query, genre: str | None = None, company_id: int | None = None,
+                 release_year_min: int | None = None, release_year_max: int | None = None,
+                 budget_min: int | None = None, budget_max: int | None = None):
+    # Shared by the list and export endpoints; works on a Query or a select(). See film_sorts
+    # for which index answers which filters.
+    if genre:
+        # Semi-join driven from film_genre: the unique genre name, then a range of (genre_id, film_id)
+        film_ids = select(models.film_genre.c.film_id).join(models.Genre).where(models.Genre.name == genre)
+        query = query.filter(models.Film.id.in_(film_ids))
+    if company_id is not None:
+        query = query.filter(models.Film.company_id == company_id)
+    if release_year_min is not None:
+        query = query.filter(models.Film.release_year >= release_year_min)
+    if release_year_max is not None:
+        query = query.filter(models.Film.release_year <= release_year_max)
+    if budget_min is not None:
+        query = query.filter(models.Film.budget >= budget_min)
+    if budget_max is not None:
+        query = query.filter(models.Film.budget <= budget_max)
+    return query
+
+
+def get_films(db: Session, skip: int = 0, limit: int = 100, after: str | None = None, sort: str | None = None,
+              load: tuple = FILM_LOAD, **filters) -> Page:
+    sort = sort or default_film_sort(filters)
+    allowed = film_sorts(filters)
+    if sort.removeprefix("-") not in allowed:
+        raise PaginationError(f"Sort `{sort}` can't be combined with filters {sorted(filters)}, "
+                              f"expected one of {sorted(allowed)}")
+    query = filter_films(db.query(models.Film).options(*load), **filters)
+    return paginate(query, FILM_SORTS, sort=sort, after=after, limit=limit, skip=skip)
+
+
+def search_films(db: Session, q: str, limit: int = 20):
+    return search.search_films(db, q, limit, FILM_LOAD)
+
+
+def get_films_by_ids(db: Session, ids: list[int], load: tuple = FILM_LOAD) -> Page:
+    return Page(loader(db, models.Film, load).get_many(ids), None)
 
 
 def create_film(db: Session, film: schemas.FilmCreateSchema):
@@ -240,8 +524,8 @@ def create_film(db: Session, film: schemas.FilmCreateSchema):
     db.add(db_film)
     
     db.commit()
-    db.refresh(db_film)
-    return db_film
+    response_cache.invalidate({("film", db_film.id), ("company", db_film.company_id)})
+    return get_film(db, db_film.id)
 
 
 def update_film(db: Session, film: schemas.FilmCreateSchema):
@@ -257,21 +541,26 @@ def update_film(db: Session, film: schemas.FilmCreateSchema):
     return db_film
 
 
-def get_company(db: Session, id: int):
+def get_company(db: Session, id: int, load: tuple = COMPANY_LOAD):
     # return db.query(models.Company).filter(models.Company.id == id).first()
-    return db.query(models.Company).options(joinedload(models.Company.staff)).options(joinedload(models.Company.films)).where(models.Company.id == id).first()
+    return loader(db, models.Company, load).get(id)
+
+
+def get_companies_by_ids(db: Session, ids: list[int], load: tuple = COMPANY_LOAD) -> Page:
+    return Page(loader(db, models.Company, load).get_many(ids), None)
 
 
 def get_company_by_name(db: Session, name: str):
     return db.query(models.Company).filter(models.Company.name == name).first()
 
 
-def get_companies(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Company).options(joinedload(models.Company.staff)).offset(skip).limit(limit).all()
+def get_companies(db: Session, skip: int = 0, limit: int = 100, after: str | None = None, sort: str = "id",
+                  load: tuple = COMPANY_LOAD) -> Page:
+    query = db.query(models.Company).options(*load)
+    return paginate(query, COMPANY_SORTS, sort=sort, after=after, limit=limit, skip=skip)
 
 
 def create_company(db: Session, company: schemas.CompanyCreateSchema):
-    print('Company: ', company)
     db_company = models.Company(
             name=company.name,
             contact_email_address=company.contact_email_address,
@@ -297,8 +586,9 @@ def create_company(db: Session, company: schemas.CompanyCreateSchema):
         db.add_all(films)
         db.flush()
     
-    # TODO: 
-    return db_company
+    db.commit()
+    response_cache.invalidate({("company", db_company.id)} | {("company", film.company_id) for film in films})
+    return get_company(db, db_company.id)
 
 
 def update_company(db: Session, company: schemas.CompanyUpdateSchema):
@@ -312,3 +602,138 @@ def update_company(db: Session, company: schemas.CompanyUpdateSchema):
     db.commit()
     db.refresh(db_company)
     return db_company
+
+
+# ================ Stats ===============
+# Read straight from the summary tables stats.py keeps up to date
+
+def get_company_stats(db: Session, id: int):
+    stats_row = models.company_stats.c
+    return db.execute(
+        select(models.Company.id.label("company_id"),
+               func.coalesce(stats_row.film_count, 0).label("film_count"),
+               func.coalesce(stats_row.total_budget, 0).label("total_budget"))
+        .outerjoin(models.company_stats, stats_row.company_id == models.Company.id)
+        .where(models.Company.id == id)
+    ).mappings().first()
+
+
+def get_film_stats(db: Session, group_by: str):
+    table = models.release_year_stats if group_by == "release_year" else models.company_stats
+    return db.execute(
+        select(table).where(table.c.film_count > 0).order_by(table.c[group_by])
+    ).mappings().all()
+
+
+def get_crew_stats(db: Session):
+    table = models.crew_role_stats
+    return db.execute(select(table).where(table.c.member_count > 0).order_by(table.c.role)).mappings().all()
+
+
+# ================ Bulk create ===============
+# One uniqueness query per chunk and one multi-row INSERT ... RETURNING (insertmanyvalues)
+# per table instead of lookup + insert + commit + refresh per row. Results are returned
+# per item as (id, None) or (None, error), aligned with the input.
+
+
+def existing_values(db: Session, column, values) -> set:
+    values = list(set(values))
+    found = set()
+    for i in range(0, len(values), IN_CHUNK_SIZE):
+        found.update(db.scalars(select(column).where(column.in_(values[i:i + IN_CHUNK_SIZE]))))
+    return found
+
+
+def _bulk_insert(db: Session, model, rows: list[dict], key: str, duplicate: str, invalid: dict | None = None,
+                 casefold: bool = False):
+    # casefold matches a unique index on lower(key), like users' email
+    column = getattr(model, key)
+    fold = str.lower if casefold else (lambda value: value)
+    existing = existing_values(db, func.lower(column) if casefold else column, [fold(row[key]) for row in rows])
+    results, pending, seen = [None] * len(rows), [], set()
+    for i, row in enumerate(rows):
+        value = fold(row[key])
+        if invalid and i in invalid:
+            results[i] = (None, invalid[i])
+        elif value in existing or value in seen:
+            results[i] = (None, duplicate.format(row[key]))
+        else:
+            seen.add(value)
+            pending.append(i)
+    if pending:
+        # RETURNING order isn't asked for (sort_by_parameter_order): SQLite can't promise it and
+        # would fall back to one INSERT per row. The unique key ties each id back to its row.
+        created = db.execute(insert(model).returning(model.id, column), [rows[i] for i in pending])
+        ids = {fold(value): id for id, value in created}
+        for i in pending:
+            results[i] = (ids[fold(rows[i][key])], None)
+    return results
+
+
+def bulk_create_users(db: Session, users: list[schemas.UserCreateSimple]):
+    rows = [user.model_dump(include={"first_name", "last_name", "email", "minimun_fee"}) for user in users]
+    results = _bulk_insert(db, models.User, rows, "email", "User with email `{}` already registered", casefold=True)
+    db.commit()
+    # No cached detail shows a new user, but list GETs already in flight mustn't be joined (coalesce.py)
+    response_cache.invalidate(set())
+    return results
+
+
+def bulk_create_companies(db: Session, companies: list[schemas.CompanyCreateSimple]):
+    rows = [company.model_dump(include={"name", "contact_email_address", "phone_number"}) for company in companies]
+    results = _bulk_insert(db, models.Company, rows, "name", "Company with name `{}` already exist, try editing")
+    db.commit()
+    response_cache.invalidate(set())
+    return results
+
+
+def bulk_create_films(db: Session, films: list[schemas.FilmCreateSimple]):
+    rows = [film.model_dump(include={"title", "description", "budget", "release_year", "company_id"}) for film in films]
+    for row in rows:
+        # company_id defaults to 0 in the schema, which is "no company" rather than a row
+        row["company_id"] = row["company_id"] or None
+    companies = existing_values(db, models.Company.id, [row["company_id"] for row in rows if row["company_id"]])
+    invalid = {
+        i: f"Company with company id ({row['company_id']}) not found"
+        for i, row in enumerate(rows) if row["company_id"] and row["company_id"] not in companies
+    }
+    results = _bulk_insert(db, models.Film, rows, "title", "Film with title `{}` already registered", invalid)
+    models.link_genres(db.connection(), {id: film.genres or [] for film, (id, _) in zip(films, results) if id})
+    stats.add_films(db.connection(), [row for row, (id, _) in zip(rows, results) if id])
+    db.commit()
+    response_cache.invalidate({("company", row["company_id"]) for row, (id, _) in zip(rows, results) if id and row["company_id"]})
+    search.index_films([(id, row["title"], row["description"]) for row, (id, _) in zip(rows, results) if id])
+    return results
+
+
+# ================ Export ===============
+# Flat rows only (no crew/staff), read through a server-side cursor in yield_per batches.
+
+EXPORT_BATCH_SIZE = 1000
+
+
+def export_statement(kind: str, **filters):
+    if kind == "users":
+        stmt = select(models.User)
+    elif kind == "films":
+        stmt = filter_films(select(models.Film).options(selectinload(models.Film.genre_rows)), **filters)
+    else:
+        stmt = select(models.Company)
+    entity = stmt.column_descriptions[0]["entity"]
+    return stmt.order_by(entity.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+
+def export_batches(db: Session, stmt):
+    yield from db.scalars(stmt).partitions()
+
+
+# ================ Warm up ===============
+
+def warm_up(db: Session):
+    # One pass over the hot reads at startup. Running them (with a row each where the
+    # tables have any) fills the compiled SQL cache, selectin loads included, and on
+    # asyncpg the prepared statement cache of each connection used
+    for get_list, get_one in ((get_users, get_user), (get_films, get_film), (get_companies, get_company)):
+        for item in get_list(db, limit=1).items:
+            get_one(db, item.id)
+    db.rollback()
@@ -1,5 +1,13 @@
-from decouple import config
-from sqlalchemy import create_engine
+import asyncio
+import itertools
+import threading
+import time
+
+from decouple import Csv, config
+from sqlalchemy import create_engine, event, exc, insert, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -8,14 +16,347 @@ DB_SERVER = config("DB_SERVER", default="localhost")
 DB_NAME = config("DB_NAME", default="")
 DB_USER = config("DB_USER", default="")
 DB_PASS = config("DB_PASS", default="")
+# Fail any lazy load instead of silently emitting one query per row (use in dev/CI)
+DB_STRICT_LOADING = config("DB_STRICT_LOADING", default=False, cast=bool)
 
 SQLALCHEMY_POSTGRES_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASS}@{DB_SERVER}/{DB_NAME}"
+# Full URL override, e.g. sqlite:///./simplecrud.db for a local stand-in
+DB_URL = config("DB_URL", default="") or SQLALCHEMY_POSTGRES_DATABASE_URL
+# Serve requests from an AsyncSession (asyncpg/aiosqlite) instead of the threadpool + sync Session
+DB_ASYNC = config("DB_ASYNC", default=False, cast=bool)
+
+
+def async_url(url: str) -> str:
+    return url.replace("postgresql://", "postgresql+asyncpg://", 1).replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+
+DB_ASYNC_URL = config("DB_ASYNC_URL", default="") or async_url(DB_URL)
+# Optional read replicas (comma separated URLs): GET requests are served from them round robin.
+# Each is pinged every DB_REPLICA_CHECK_INTERVAL seconds and sits out while it fails its check
+# or after a request fails to connect to it. A client that has just written reads from the
+# primary for DB_STICKY_SECONDS so it sees its own writes.
+DB_REPLICA_URLS = config("DB_REPLICA_URLS", default="", cast=Csv())
+DB_REPLICA_CHECK_INTERVAL = config("DB_REPLICA_CHECK_INTERVAL", default=10.0, cast=float)
+DB_STICKY_SECONDS = config("DB_STICKY_SECONDS", default=5, cast=int)
+
+
+# Connections each worker opens at startup, before it reports ready (see prewarm)
+DB_PREWARM_CONNECTIONS = config("DB_PREWARM_CONNECTIONS", default=0, cast=int)
+
+# Pool tuning (per worker process). DB_POOL=null hands pooling to an external pooler (pgbouncer)
+DB_POOL = config("DB_POOL", default="queue")
+DB_POOL_SIZE = config("DB_POOL_SIZE", default=5, cast=int)
+DB_MAX_OVERFLOW = config("DB_MAX_OVERFLOW", default=10, cast=int)
+DB_POOL_TIMEOUT = config("DB_POOL_TIMEOUT", default=30.0, cast=float)
+DB_POOL_RECYCLE = config("DB_POOL_RECYCLE", default=-1, cast=int)
+DB_POOL_PRE_PING = config("DB_POOL_PRE_PING", default=False, cast=bool)
+# SQLAlchemy compiled-SQL cache, and the asyncpg prepared statement cache (0 behind pgbouncer)
+DB_QUERY_CACHE_SIZE = config("DB_QUERY_CACHE_SIZE", default=500, cast=int)
+DB_STATEMENT_CACHE_SIZE = config("DB_STATEMENT_CACHE_SIZE", default=100, cast=int)
+
+
+class PoolWaitStats:
+    # How long callers waited for a connection, including connects made on checkout
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def observe(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_total_ms": round(self.total_wait * 1000, 3),
+                "wait_avg_ms": round(self.total_wait * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.max_wait * 1000, 3),
+            }
+
+
+pool_wait_stats = PoolWaitStats()
+
+
+def timed_pool(pool_class):
+    class TimedPool(pool_class):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                conn = super()._do_get()
+            except exc.TimeoutError:
+                pool_wait_stats.observe(time.perf_counter() - start, timed_out=True)
+                raise
+            pool_wait_stats.observe(time.perf_counter() - start)
+            return conn
+
+    TimedPool.__name__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+
+TimedQueuePool = timed_pool(QueuePool)
+TimedAsyncAdaptedQueuePool = timed_pool(AsyncAdaptedQueuePool)
+
+
+def connect_args(url: str) -> dict:
+    # SQLite connections are used from the threadpool, not the thread that opened them
+    if url.startswith("sqlite"):
+        return {"check_same_thread": False}
+    if url.startswith("postgresql+asyncpg"):
+        return {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    return {}
+
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    options = {"connect_args": connect_args(url), "query_cache_size": DB_QUERY_CACHE_SIZE}
+    if DB_POOL == "null":
+        return {**options, "poolclass": NullPool}
+    if url.startswith("sqlite") and ":memory:" in url:
+        # In-memory SQLite keeps its default single-connection pool
+        return options
+    return {
+        **options,
+        "poolclass": TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def pool_stats(engine) -> dict:
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            max_overflow=pool._max_overflow,
+            timeout=pool.timeout(),
+        )
+    return stats
+
+
+# Nothing below connects or even builds an engine at import: engines are created on
+# first use and the session factories bind themselves to them when first called.
+_engines = {}
+_engines_lock = threading.Lock()
+_engine_hooks = []
+
+
+def _sync(engine):
+    return getattr(engine, "sync_engine", engine)
+
+
+def on_engine(hook):
+    # Runs hook(sync_engine) for every engine as it is built, and now for any already built
+    with _engines_lock:
+        if hook in _engine_hooks:
+            return
+        _engine_hooks.append(hook)
+        built = list(_engines.values())
+    for engine in built:
+        hook(_sync(engine))
+
+
+def _build(key: str, factory):
+    with _engines_lock:
+        if key not in _engines:
+            engine = _engines[key] = factory()
+            for hook in _engine_hooks:
+                hook(_sync(engine))
+        return _engines[key]
+
+
+def get_engine():
+    return _build("sync", lambda: create_engine(DB_URL, **engine_options(DB_URL)))
+
+
+def get_async_engine():
+    # Only built when asked for so the async drivers stay optional
+    return _build("async", lambda: create_async_engine(DB_ASYNC_URL, **engine_options(DB_ASYNC_URL, is_async=True)))
+
 
-engine = create_engine(SQLALCHEMY_POSTGRES_DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
+def request_engine():
+    # The sync Engine behind request sessions, for pool stats
+    return get_async_engine().sync_engine if DB_ASYNC else get_engine()
+
+
+async def dispose_engines():
+    with _engines_lock:
+        engines = list(_engines.values())
+    for engine in engines:
+        if engine is _sync(engine):
+            engine.dispose()
+        else:
+            await engine.dispose()
+
+
+class ReplicaSet:
+    """Round robin over the read replicas that haven't failed recently."""
+
+    def __init__(self, urls: list[str], interval: float):
+        self.urls = urls
+        self.interval = interval
+        self._turn = itertools.count()
+        self._down_until = {}  # replica index -> time.monotonic() it may be tried again
+        self._probes = {}  # replica index -> unpooled engine for health checks
+        self._stop = threading.Event()
+
+    def __bool__(self):
+        return bool(self.urls)
+
+    def engine(self, index: int, is_async: bool = False):
+        def build():
+            url = self.urls[index]
+            engine = (create_async_engine(async_url(url), **engine_options(async_url(url), is_async=True)) if is_async
+                      else create_engine(url, **engine_options(url)))
+            event.listen(_sync(engine), "handle_error", lambda context: self._failed(index, context))
+            return engine
+        return _build(self._key(index, is_async), build)
+
+    @staticmethod
+    def _key(index: int, is_async: bool) -> str:
+        return f"replica{index}-async" if is_async else f"replica{index}"
+
+    def _failed(self, index: int, context):
+        # Connect errors and dropped connections take the replica out of rotation for a while
+        if context.connection is None or context.is_disconnect:
+            self._down_until[index] = time.monotonic() + self.interval
+
+    def check(self):
+        for index, url in enumerate(self.urls):
+            probe = self._probes.setdefault(index, create_engine(url, poolclass=NullPool, connect_args=connect_args(url)))
+            try:
+                with probe.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+            except exc.SQLAlchemyError:
+                self._down_until[index] = time.monotonic() + self.interval
+            else:
+                self._down_until.pop(index, None)
+
+    def start(self):
+        # Checks in a daemon thread from now on; the app runs the first check itself at startup
+        self._stop.clear()
+        threading.Thread(target=self._watch, name="replica-health", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def pick(self, is_async: bool = False):
+        # None when every replica is down; the caller falls back to the primary
+        now = time.monotonic()
+        for _ in range(len(self.urls)):
+            index = next(self._turn) % len(self.urls)
+            if self._down_until.get(index, 0) <= now:
+                return self.engine(index, is_async)
+        return None
+
+    def stats(self) -> list[dict]:
+        now = time.monotonic()
+        replicas = []
+        for index in range(len(self.urls)):
+            replica = {"replica": index, "healthy": self._down_until.get(index, 0) <= now}
+            engine = _engines.get(self._key(index, DB_ASYNC))
+            if engine is not None:
+                replica.update(pool_stats(_sync(engine)))
+            replicas.append(replica)
+        return replicas
+
+
+replicas = ReplicaSet(DB_REPLICA_URLS, DB_REPLICA_CHECK_INTERVAL)
+
+
+class LazySessionMaker(sessionmaker):
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_engine())
+        return super().__call__(**local_kw)
+
+
+class LazyAsyncSessionMaker(async_sessionmaker):
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_async_engine())
+        return super().__call__(**local_kw)
+
+
+# Objects stay loaded after commit so write paths can respond from what they just wrote
+SessionLocal = LazySessionMaker(expire_on_commit=False)
 # SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
 
-# Create the tables in the database
-Base.metadata.create_all(engine)
\ No newline at end of file
+class LazyLoadError(RuntimeError):
+    pass
+
+
+def raise_on_lazy_load(orm_execute_state):
+    # Eager loaders (selectin/joined) never set lazy_loaded_from, only on-access lazy loads do
+    if not orm_execute_state.is_select:
+        return
+    state = orm_execute_state.lazy_loaded_from
+    if state is not None:
+        raise LazyLoadError(f"Lazy load emitted from {state.class_.__name__}; add it to the loading plan in crud.py")
+
+
+if DB_STRICT_LOADING:
+    event.listen(SessionLocal, "do_orm_execute", raise_on_lazy_load)
+
+# Share the sync session class so the strict loading hook applies here too;
+# nothing may be lazily refreshed after commit outside the greenlet bridge
+AsyncSessionLocal = LazyAsyncSessionMaker(sync_session_class=SessionLocal.class_, expire_on_commit=False)
+
+
+async def prewarm(connections: int) -> int:
+    # Opens up to `connections` pooled connections at once (bounded by the pool size) so
+    # the first requests don't pay for connects; they go back to the pool idle
+    pool = request_engine().pool
+    if not isinstance(pool, QueuePool):
+        return 0
+    count = min(connections, pool.size())
+    if DB_ASYNC:
+        held = await asyncio.gather(*(get_async_engine().connect().start() for _ in range(count)))
+        await asyncio.gather(*(conn.close() for conn in held))
+    else:
+        held = await asyncio.gather(*(asyncio.to_thread(get_engine().connect) for _ in range(count)))
+        for conn in held:
+            conn.close()
+    return len(held)
+
+
+def insert_ignore(table, dialect_name: str, index_elements: list[str]):
+    # INSERT ... ON CONFLICT DO NOTHING where the dialect has it, a plain INSERT elsewhere
+    if dialect_name == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing(index_elements=index_elements)
+    if dialect_name == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing(index_elements=index_elements)
+    return insert(table)
+
+
+def upsert_add(table, dialect_name: str, index_elements: list[str], columns: list[str]):
+    # INSERT ... ON CONFLICT DO UPDATE SET col = col + excluded.col, i.e. an atomic counter bump
+    dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(dialect_name)
+    if dialect is None:
+        raise NotImplementedError(f"No upsert for {dialect_name}")
+    stmt = dialect.insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements, set_={c: table.c[c] + stmt.excluded[c] for c in columns},
+    )
+
+
+Base = declarative_base()
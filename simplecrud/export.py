@@ -0,0 +1,54 @@
+import csv
+import io
+
+from simplecrud import crud, schemas, serializers
+from simplecrud.database import DB_ASYNC, AsyncSessionLocal, SessionLocal, replicas
+
+# Flat schema per exportable table; their fields are also the CSV header
+EXPORT_SCHEMAS = {"users": schemas.User, "films": schemas.Film, "companies": schemas.Company}
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _encode(batch: list, serialize, fmt: str, header: list[str] | None) -> bytes:
+    rows = [serialize(obj) for obj in batch]
+    if fmt == "ndjson":
+        return b"".join(serializers.dumps(row) + b"\n" for row in rows)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(header)
+    for row in rows:
+        writer.writerow("|".join(v) if isinstance(v, list) else v for v in row.values())
+    return buffer.getvalue().encode()
+
+
+def _replica_bind(is_async: bool) -> dict:
+    # Exports are the heaviest reads there are; they go to a replica whenever one is up
+    replica = replicas.pick(is_async) if replicas else None
+    return {"bind": replica} if replica is not None else {}
+
+
+def _stream(kind: str, fmt: str, filters: dict):
+    # Runs in Starlette's threadpool, one batch in memory at a time. The request's own
+    # session is closed before the body is sent, so the stream opens its own.
+    serialize = serializers.serializer(EXPORT_SCHEMAS[kind])
+    header = list(EXPORT_SCHEMAS[kind].model_fields) if fmt == "csv" else None
+    if header:
+        yield _encode([], serialize, fmt, header)
+    with SessionLocal(**_replica_bind(is_async=False)) as db:
+        for batch in crud.export_batches(db, crud.export_statement(kind, **filters)):
+            yield _encode(batch, serialize, fmt, None)
+
+
+async def _stream_async(kind: str, fmt: str, filters: dict):
+    serialize = serializers.serializer(EXPORT_SCHEMAS[kind])
+    if fmt == "csv":
+        yield _encode([], serialize, fmt, list(EXPORT_SCHEMAS[kind].model_fields))
+    async with AsyncSessionLocal(**_replica_bind(is_async=True)) as db:
+        result = await db.stream_scalars(crud.export_statement(kind, **filters))
+        async for batch in result.partitions():
+            yield _encode(batch, serialize, fmt, None)
+
+
+def stream(kind: str, fmt: str, **filters):
+    return _stream_async(kind, fmt, filters) if DB_ASYNC else _stream(kind, fmt, filters)
@@ -0,0 +1,112 @@
+"""Collaboration graph: users linked through the films they crewed (user_film) and the
+companies they staff (company_user).
+
+Traversals are breadth-first and run one level at a time in SQL: frontier users -> the
+films/companies they are linked to -> the other users linked to those. Each film or
+company is expanded once per search and each query groups its rows, so a level costs
+two indexed IN queries per link kind however dense the films are, and only the part of
+the graph within the depth limit is ever read. Links change with every user and film
+update, so reading them fresh avoids keeping a per-worker copy of the graph in sync.
+"""
+from sqlalchemy import func, select
+
+from . import models
+
+LINKS = {
+    "film": (models.FilmCrewMembers.__table__, "film_id"),
+    "company": (models.CompanyStaff.__table__, "company_id"),
+}
+MAX_COLLABORATOR_DEPTH = 3
+MAX_PATH_DEPTH = 6
+# Stop widening a search once it has seen this many users
+MAX_VISITED = 200_000
+CHUNK_SIZE = 500  # like crud.IN_CHUNK_SIZE
+
+
+class Search:
+    """Breadth-first search outwards from one user."""
+
+    def __init__(self, db, start: int, via: tuple[str, ...], roles: tuple[str, ...]):
+        self.db = db
+        self.via = via
+        self.roles = roles
+        self.depth = 0
+        self.frontier = [start]
+        self.distances = {start: 0}
+        self.parents = {start: None}  # user -> (kind, hub id) it was reached through
+        self.hub_parents = {}  # (kind, hub id) -> user it was reached from
+
+    def _grouped(self, table, key: str, column: str, values: list[int]) -> dict[int, int]:
+        # {key: lowest column value} over the links whose column is in values
+        stmt = select(table.c[key], func.min(table.c[column])).group_by(table.c[key])
+        if self.roles:
+            stmt = stmt.where(table.c.role.in_(self.roles))
+        grouped = {}
+        for i in range(0, len(values), CHUNK_SIZE):
+            for k, value in self.db.execute(stmt.where(table.c[column].in_(values[i:i + CHUNK_SIZE]))):
+                grouped[k] = min(value, grouped.get(k, value))
+        return grouped
+
+    def step(self) -> list[int]:
+        """Expands the frontier by one level and returns the users reached for the first time."""
+        self.depth += 1
+        reached = []
+        for kind in self.via:
+            table, hub_key = LINKS[kind]
+            hubs = []
+            for hub, user in sorted(self._grouped(table, hub_key, "user_id", self.frontier).items()):
+                if (kind, hub) not in self.hub_parents:
+                    self.hub_parents[kind, hub] = user
+                    hubs.append(hub)
+            for user, hub in sorted(self._grouped(table, "user_id", hub_key, hubs).items()):
+                if user not in self.parents:
+                    self.parents[user] = (kind, hub)
+                    self.distances[user] = self.depth
+                    reached.append(user)
+        self.frontier = reached
+        return reached
+
+    @property
+    def exhausted(self) -> bool:
+        return not self.frontier or len(self.parents) > MAX_VISITED
+
+    def path_to(self, user: int) -> list[tuple]:
+        # [(start, None, None), ..., (user, kind, hub id)]; kind and hub link each user to the one before
+        path = []
+        while (link := self.parents[user]) is not None:
+            path.append((user, *link))
+            user = self.hub_parents[link]
+        path.append((user, None, None))
+        return path[::-1]
+
+
+def collaborators(db, user_id: int, depth: int, via: tuple[str, ...], roles: tuple[str, ...] = (),
+                  limit: int = 100) -> list[tuple[int, int]]:
+    """(user id, distance) for everyone within depth hops of user_id, nearest first."""
+    search = Search(db, user_id, via, roles)
+    found = []
+    while search.depth < depth and len(found) < limit and not search.exhausted:
+        found += [(user, search.depth) for user in search.step()]
+    return found[:limit]
+
+
+def shortest_path(db, source: int, target: int, max_depth: int, via: tuple[str, ...],
+                  roles: tuple[str, ...] = ()) -> list[tuple] | None:
+    """Shortest chain of collaborations from source to target as (user, kind, hub id) steps,
+    or None if there is none within max_depth hops.
+
+    Searches from both ends, always widening the smaller frontier, so the cost grows with
+    the square root of what a one-sided search would read.
+    """
+    if source == target:
+        return [(source, None, None)]
+    forward, backward = Search(db, source, via, roles), Search(db, target, via, roles)
+    while forward.depth + backward.depth < max_depth and not (forward.exhausted or backward.exhausted):
+        side, other = (forward, backward) if len(forward.frontier) <= len(backward.frontier) else (backward, forward)
+        meets = [user for user in side.step() if user in other.parents]
+        if meets:
+            meet = min(meets, key=lambda user: (other.distances[user], user))
+            head, tail = forward.path_to(meet), backward.path_to(meet)
+            # tail runs target -> meet; walk it back, moving each link onto the user before it
+            return head + [(tail[i - 1][0], *tail[i][1:]) for i in range(len(tail) - 1, 0, -1)]
+    return None
@@ -0,0 +1,219 @@
+"""Streaming CSV/NDJSON import behind `simplecrud import`.
+
+Records are read lazily, validated with the schemas.py models and written one
+batch per transaction: COPY on Postgres (psycopg2), executemany elsewhere.
+Foreign keys are given by natural key (user_email, film_title, company_name)
+and resolved with one IN query per batch. After every committed batch the
+last line is checkpointed next to the input file, so an interrupted run
+resumes where it stopped. Rows that fail validation or reference unknown
+rows are appended to <file>.rejects.ndjson. Memory is bounded by one batch.
+"""
+import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, tuple_
+
+from simplecrud import crud, models, schemas, stats
+from simplecrud.cache import response_cache
+from simplecrud.database import SessionLocal
+
+KINDS = {
+    "users": schemas.UserCreateSimple,
+    "companies": schemas.CompanyCreateSimple,
+    "films": schemas.FilmImportSchema,
+    "user_film": schemas.FilmCrewImportSchema,
+    "company_user": schemas.CompanyStaffImportSchema,
+}
+
+
+def read_records(path: str, fmt: str):
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            for row in csv.DictReader(f):
+                # Empty cells fall back to the schema defaults
+                record = {key: value for key, value in row.items() if value != ""}
+                if isinstance(record.get("genres"), str):
+                    record["genres"] = [g for g in record["genres"].split("|") if g]
+                yield record
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _lookup(db, key_column, id_column, values) -> dict:
+    values = list(set(values))
+    found = {}
+    for i in range(0, len(values), crud.IN_CHUNK_SIZE):
+        found.update(db.execute(select(key_column, id_column).where(key_column.in_(values[i:i + crud.IN_CHUNK_SIZE]))).all())
+    return found
+
+
+def _insert_rows(db, table, rows: list[dict]):
+    if not rows:
+        return
+    conn = db.connection()
+    if conn.dialect.driver != "psycopg2":
+        conn.execute(insert(table), rows)
+        return
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    # csv.writer can't tell None from "" apart, so NULL travels as an unquoted \N marker
+    csv.writer(buffer).writerows([r"\N" if row[c] is None else row[c] for c in columns] for row in rows)
+    buffer.seek(0)
+    with conn.connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+
+
+def _new_only(rows: list[dict], key, existing, fold=lambda value: value) -> list[dict]:
+    seen, fresh = set(existing), []
+    for row in rows:
+        if fold(row[key]) not in seen:
+            seen.add(fold(row[key]))
+            fresh.append(row)
+    return fresh
+
+
+def _write_users(db, batch):
+    rows = [obj.model_dump(include={"first_name", "last_name", "email", "minimun_fee"}) for _, obj in batch]
+    existing = crud.existing_values(db, func.lower(models.User.email), [r["email"].lower() for r in rows])
+    fresh = _new_only(rows, "email", existing, fold=str.lower)
+    _insert_rows(db, models.User.__table__, fresh)
+    return len(fresh), []
+
+
+def _write_companies(db, batch):
+    rows = [obj.model_dump(include={"name", "contact_email_address", "phone_number"}) for _, obj in batch]
+    fresh = _new_only(rows, "name", crud.existing_values(db, models.Company.name, [r["name"] for r in rows]))
+    _insert_rows(db, models.Company.__table__, fresh)
+    return len(fresh), []
+
+
+def _write_films(db, batch):
+    companies = _lookup(db, models.Company.name, models.Company.id, [obj.company_name for _, obj in batch if obj.company_name])
+    company_ids = crud.existing_values(db, models.Company.id, [obj.company_id for _, obj in batch if obj.company_id])
+    rows, genres, rejects = [], {}, []
+    for line, obj in batch:
+        if obj.company_name:
+            company_id = companies.get(obj.company_name)
+        else:
+            company_id = obj.company_id if obj.company_id in company_ids else None
+        if company_id is None and (obj.company_name or obj.company_id):
+            rejects.append((line, f"Unknown company `{obj.company_name or obj.company_id}`"))
+            continue
+        rows.append({**obj.model_dump(include={"title", "description", "budget", "release_year"}), "company_id": company_id})
+        genres[obj.title] = obj.genres or []
+    fresh = _new_only(rows, "title", crud.existing_values(db, models.Film.title, [r["title"] for r in rows]))
+    _insert_rows(db, models.Film.__table__, fresh)
+    ids = _lookup(db, models.Film.title, models.Film.id, [r["title"] for r in fresh])
+    models.link_genres(db.connection(), {ids[r["title"]]: genres[r["title"]] for r in fresh})
+    stats.add_films(db.connection(), fresh)
+    return len(fresh), rejects
+
+
+def _write_links(db, batch, table, target_key, target_column, target_id_column, target_name):
+    # Emails are unique case-insensitively (uq_users_email_lower), so match them the same way
+    users = _lookup(db, func.lower(models.User.email), models.User.id, [obj.user_email.lower() for _, obj in batch])
+    targets = _lookup(db, target_column, target_id_column, [getattr(obj, target_key) for _, obj in batch])
+    rows, rejects = [], []
+    for line, obj in batch:
+        target = targets.get(getattr(obj, target_key))
+        user = users.get(obj.user_email.lower())
+        if user is None or target is None:
+            rejects.append((line, f"Unknown user `{obj.user_email}` or {target_name} `{getattr(obj, target_key)}`"))
+            continue
+        rows.append({"user_id": user, f"{target_name}_id": target, "role": obj.role})
+    key = (table.c.user_id, table.c[f"{target_name}_id"])
+    pairs = list({(r["user_id"], r[f"{target_name}_id"]) for r in rows})
+    seen, fresh = set(), []
+    for i in range(0, len(pairs), crud.IN_CHUNK_SIZE):
+        seen.update(tuple(pair) for pair in db.execute(select(*key).where(tuple_(*key).in_(pairs[i:i + crud.IN_CHUNK_SIZE]))))
+    for row in rows:
+        pair = (row["user_id"], row[f"{target_name}_id"])
+        if pair not in seen:
+            seen.add(pair)
+            fresh.append(row)
+    _insert_rows(db, table, fresh)
+    if table is models.FilmCrewMembers.__table__:
+        stats.add_crew(db.connection(), [row["role"] for row in fresh])
+    return len(fresh), rejects
+
+
+WRITERS = {
+    "users": _write_users,
+    "companies": _write_companies,
+    "films": _write_films,
+    "user_film": lambda db, batch: _write_links(
+        db, batch, models.FilmCrewMembers.__table__, "film_title", models.Film.title, models.Film.id, "film"),
+    "company_user": lambda db, batch: _write_links(
+        db, batch, models.CompanyStaff.__table__, "company_name", models.Company.name, models.Company.id, "company"),
+}
+
+
+class Checkpoint:
+    def __init__(self, path: str, kind: str):
+        self.path = f"{path}.{kind}.checkpoint"
+
+    def load(self) -> int:
+        try:
+            with open(self.path) as f:
+                return json.load(f)["line"]
+        except FileNotFoundError:
+            return 0
+
+    def save(self, line: int):
+        with open(f"{self.path}.tmp", "w") as f:
+            json.dump({"line": line}, f)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def import_file(kind: str, path: str, fmt: str | None = None, batch_size: int = 1000, restart: bool = False, out=print) -> dict:
+    fmt = fmt or ("csv" if path.endswith(".csv") else "ndjson")
+    schema, write = KINDS[kind], WRITERS[kind]
+    checkpoint = Checkpoint(path, kind)
+    start = 0 if restart else checkpoint.load()
+    if start:
+        out(f"Resuming {path} after line {start}")
+    stats = {"read": start, "inserted": 0, "existing": 0, "rejected": 0}
+    started = time.perf_counter()
+    records = islice(enumerate(read_records(path, fmt), 1), start, None)
+
+    with open(f"{path}.rejects.ndjson", "a" if start else "w", encoding="utf-8") as rejects_file:
+        while chunk := list(islice(records, batch_size)):
+            batch, rejects = [], []
+            for line, record in chunk:
+                try:
+                    batch.append((line, schema.model_validate(record)))
+                except ValidationError as e:
+                    rejects.append((line, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())))
+            with SessionLocal() as db:
+                inserted, unresolved = write(db, batch) if batch else (0, [])
+                db.commit()
+            # Films and links change what cached details embed; also moves the epoch (see coalesce.py).
+            # Only matters when importing in-process, the CLI has no cache of its own
+            response_cache.clear()
+            rejects += unresolved
+            for line, error in rejects:
+                rejects_file.write(json.dumps({"line": line, "error": error}) + "\n")
+            rejects_file.flush()
+            checkpoint.save(chunk[-1][0])
+
+            stats["read"] = chunk[-1][0]
+            stats["inserted"] += inserted
+            stats["rejected"] += len(rejects)
+            stats["existing"] += len(batch) - len(unresolved) - inserted
+            rate = (stats["read"] - start) / (time.perf_counter() - started)
+            out(f"{kind}: {stats['read']} read, {stats['inserted']} inserted, {stats['existing']} already present, "
+                f"{stats['rejected']} rejected ({rate:,.0f} records/s)")
+
+    checkpoint.clear()
+    return stats
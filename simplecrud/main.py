@@ -1,60 +1,433 @@
-from fastapi import Depends, FastAPI, HTTPException, status
+from contextlib import asynccontextmanager
+from functools import partial
+
+from decouple import config
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, load_only
+from sqlalchemy.orm.exc import StaleDataError
+from starlette.datastructures import Headers, MutableHeaders
 
+import asyncio
+import logging
+import time
 import typing
 from simplecrud.models import Company
 from simplecrud import crud, models, schemas
-from simplecrud.database import SessionLocal, engine
-
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI()
+from simplecrud import coalesce, database, export, graph, metrics, profiling, search, serializers
+from simplecrud.cache import etag_for, etag_matches, etag_version, response_cache
+from simplecrud.database import DB_ASYNC, DB_PREWARM_CONNECTIONS, AsyncSessionLocal, SessionLocal
+from simplecrud.pagination import Page, PaginationError
+
+# Importing this module never touches the database: engines are built on first use and
+# tables are created by `simplecrud create-schema`. Serve with `uvicorn simplecrud.main:app`
+# or `uvicorn --factory simplecrud.main:create_app`.
+
+# Run the hot reads once at startup so their SQL is compiled (and prepared) before traffic arrives
+STARTUP_WARM_QUERIES = config("STARTUP_WARM_QUERIES", default=False, cast=bool)
+# Startup (prewarm + warm queries) slower than this is logged; benchmarks/coldstart.py checks it end to end
+STARTUP_BUDGET_MS = config("STARTUP_BUDGET_MS", default=2000, cast=float)
+
+logger = logging.getLogger("uvicorn.error")
+router = APIRouter()
+
+
+class RequestMetricsMiddleware:
+    # Plain ASGI rather than @app.middleware("http") to keep per-request overhead down
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings = metrics.RequestTimings()
+        token = metrics.current_timings.set(timings)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", timings.server_timing(time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            metrics.current_timings.reset(token)
+            # Label by route template, not the raw path, to keep the series count bounded
+            route = scope.get("route")
+            metrics.registry.observe(scope["method"], route.path if route else "unmatched", status_code,
+                                     time.perf_counter() - start, timings)
+
+
+class RequestProfilerMiddleware:
+    # Opt-in per request (see simplecrud/profiling.py); everything else passes straight through
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiling.should_profile(Headers(scope=scope)):
+            return await self.app(scope, receive, send)
+        profile = profiling.start(scope["method"], scope["path"])
+        if profile is None:
+            return await self.app(scope, receive, send)
+        token = profiling.current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiling.current_profile.reset(token)
+            profiling.stop(profile, time.perf_counter() - start)
+            profiling.profile_store.save(profile)
+
+
+async def warm_queries():
+    if DB_ASYNC:
+        async with AsyncSessionLocal() as db:
+            await crud.run(db, crud.warm_up)
+    else:
+        with SessionLocal() as db:
+            await crud.run(db, crud.warm_up)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Everything here finishes before uvicorn accepts connections, so a worker that
+    # answers /api/ready has its pool and statement caches warm
+    start = time.perf_counter()
+    if database.replicas:
+        await asyncio.to_thread(database.replicas.check)
+        database.replicas.start()
+    if not database.DB_URL.startswith("postgresql"):
+        # Postgres searches its own indexes; elsewhere the in-process film index is resynced in the background
+        search.film_index.start(SessionLocal)
+    if DB_PREWARM_CONNECTIONS:
+        await database.prewarm(DB_PREWARM_CONNECTIONS)
+    if STARTUP_WARM_QUERIES:
+        await warm_queries()
+    app.state.startup_ms = round((time.perf_counter() - start) * 1000, 3)
+    if app.state.startup_ms > STARTUP_BUDGET_MS:
+        logger.warning("Startup took %.0f ms, over the %.0f ms budget", app.state.startup_ms, STARTUP_BUDGET_MS)
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    database.replicas.stop()
+    search.film_index.stop()
+    await database.dispose_engines()
+
+
+def create_app() -> FastAPI:
+    app = FastAPI(lifespan=lifespan)
+    app.state.ready = False
+    if metrics.METRICS_ENABLED:
+        database.on_engine(metrics.instrument)
+        app.add_middleware(RequestMetricsMiddleware)
+    if profiling.PROFILE_TOKEN or profiling.PROFILE_SAMPLE_RATE:
+        database.on_engine(profiling.instrument)
+        app.add_middleware(RequestProfilerMiddleware)
+    app.include_router(router)
+    return app
+
+
+# Upper bound for one bulk call; larger loads should be split client side
+BULK_MAX_ITEMS = 10_000
+
+
+# Set on responses to writes while replicas are configured; its client reads from the primary until it expires
+STICKY_COOKIE = "simplecrud-primary"
+
+
+def session_bind(request: Request, response: Response, is_async: bool) -> dict:
+    # Reads go to a replica, writes and a client's reads right after it wrote go to the primary
+    if not database.replicas:
+        return {}
+    if request.method not in ("GET", "HEAD"):
+        response.set_cookie(STICKY_COOKIE, "1", max_age=database.DB_STICKY_SECONDS, httponly=True, samesite="lax")
+        return {}
+    if STICKY_COOKIE in request.cookies:
+        return {}
+    replica = database.replicas.pick(is_async)
+    if replica is None:
+        return {}
+    request.state.replica = True
+    return {"bind": replica}
 
 
 # Dependency
-def get_db():
-    db = SessionLocal()
+def get_sync_db(request: Request, response: Response):
+    db = SessionLocal(**session_bind(request, response, is_async=False))
     try:
         yield db
     finally:
         db.close()
 
 
-@app.get("/api/users/{id}/", response_model=schemas.UserSchema, 
+async def get_async_db(request: Request, response: Response):
+    async with AsyncSessionLocal(**session_bind(request, response, is_async=True)) as db:
+        yield db
+
+
+# DB_ASYNC picks the session flavour; the routes are the same for both (see crud.run)
+get_db = get_async_db if DB_ASYNC else get_sync_db
+
+
+def sparse_fields(kind: str, schema, fields: str | None, include: str | None, sort: str = "id"):
+    # ?fields= / ?include= -> (loader options, trimmed response schema); None when neither is given
+    if fields is None and include is None:
+        return None
+    relationships = crud.SPARSE_INCLUDES[kind]
+    scalars = [name for name in schema.model_fields if name not in relationships]
+    wanted = {name.strip() for name in fields.split(",") if name.strip()} if fields is not None else set(scalars)
+    included = {name.strip() for name in (include or "").split(",") if name.strip()}
+    unknown = sorted((wanted - set(scalars)) | (included - set(relationships)))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields {unknown}, expected any of {scalars} "
+                                                    f"and includes from {sorted(relationships)}")
+    wanted.add("id")
+    names = tuple(name for name in schema.model_fields if name in wanted or name in included)
+    # Keyset pagination reads the sort column off the last row, so it is loaded even if not returned
+    load = crud.sparse_load(kind, wanted | {sort.removeprefix("-")}, included)
+    return load, schemas.sparse_schema(schema, names)
+
+
+def batch_ids(ids: str | None = None) -> list[int] | None:
+    # ?ids=3,1,2 on the list endpoints: those rows in that order (missing ones left out) instead
+    # of a page; paging, sorting and filters don't apply
+    if ids is None:
+        return None
+    try:
+        values = list(dict.fromkeys(int(value) for value in ids.split(",") if value.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma separated list of integers")
+    if not 1 <= len(values) <= crud.MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"ids takes between 1 and {crud.MAX_BATCH_IDS} ids")
+    return values
+
+
+async def coalesced(request: Request, work):
+    # Identical GETs in flight at the same time share one run of work (see coalesce.py). A
+    # client that just wrote reads from the primary, so it doesn't join a replica read.
+    if not coalesce.COALESCE_ENABLED or STICKY_COOKIE in request.cookies:
+        return await work()
+    return await coalesce.flights.run((request.url.path, request.url.query), work)
+
+
+async def run_rendered(db, fetch, render, **kwargs) -> tuple:
+    # (result, JSON body) of fetch, rendered in the same crud.run call: in sync mode that keeps
+    # validation and encoding in the threadpool with the query. FastAPI only offloads
+    # response_model serialization for sync endpoints, and these are all async def.
+    def work(db, **kwargs):
+        result = fetch(db, **kwargs)
+        return result, None if result is None else render(result)
+
+    return await crud.run(db, work, **kwargs)
+
+
+def json_response(body: bytes, status_code: int = status.HTTP_200_OK, response: Response | None = None) -> Response:
+    out = Response(body, status_code=status_code, media_type="application/json")
+    if response is not None:
+        # Keeps what dependencies set on the injected response, e.g. the sticky cookie on writes
+        out.raw_headers.extend(header for header in response.raw_headers if header[0] != b"content-length")
+    return out
+
+
+async def paged(request: Request, fetch, db, schema, sparse=None, **kwargs) -> Response:
+    # The body stays a plain list; the opaque cursor for the next page travels in a header.
+    # Rendered here rather than through response_model so coalesced requests share the bytes.
+    if sparse:
+        kwargs["load"], schema = sparse
+
+    async def load():
+        try:
+            page, body = await run_rendered(db, fetch, lambda page: serializers.render_many(schema, page.items),
+                                            **kwargs)
+        except PaginationError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return body, page.next_cursor
+
+    body, next_cursor = await coalesced(request, load)
+    response = json_response(body)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+
+async def cached_detail(request: Request, db, key: tuple, fetch, schema, not_found: str, sparse=None) -> Response:
+    # Serves the JSON body from the response cache when possible and always sets a strong ETag.
+    # Sparse responses aren't cached: invalidation only knows the full (kind, id) keys. A client
+    # that just wrote skips the cache like it skips coalescing, so it sees its write.
+    kwargs = {}
+    if sparse:
+        kwargs["load"], schema = sparse
+    cacheable = not sparse and STICKY_COOKIE not in request.cookies
+    hit = response_cache.get(key) if cacheable else None
+    if hit is None:
+        async def load():
+            epoch = response_cache.epoch()
+            # A replica may not have a write this worker just made yet; assume it has caught up
+            # once the sticky window has passed, and until then don't cache what it returns
+            fill = cacheable and (not getattr(request.state, "replica", False)
+                                  or response_cache.quiet_for() > database.DB_STICKY_SECONDS)
+            obj, body = await run_rendered(db, fetch, lambda obj: serializers.render(schema, obj), id=key[1], **kwargs)
+            if obj is None:
+                raise HTTPException(status_code=404, detail=not_found)
+            etag = etag_for(body, getattr(obj, "version", None) if "version" in schema.model_fields else None)
+            if fill:
+                response_cache.set(key, body, etag, epoch)
+            return body, etag
+
+        hit = await coalesced(request, load)
+    body, etag = hit
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return Response(body, media_type="application/json", headers={"ETag": etag})
+
+
+def export_response(kind: str, format: str, **filters) -> StreamingResponse:
+    # Bypasses get_db on purpose: the stream outlives the request's dependencies
+    return StreamingResponse(
+        export.stream(kind, format, **filters),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{kind}.{format}"'},
+    )
+
+
+# Creates insert straight away and let the unique constraints catch duplicates, which is
+# one round trip instead of two and has no window for a concurrent insert to slip through
+DUPLICATE_DETAILS = {
+    "uq_users_email_lower": "User with email `{email}` already registered",
+    "uq_films_title": "Film with title `{title}` already registered",
+    "uq_companies_name": "Company with name `{name}` already exist, try editing",
+}
+
+
+async def duplicate_error(db, error: IntegrityError, status_code: int = 400, **values) -> Exception:
+    # A value is either the one string the request could clash on, or a list of (value, id)
+    # for nested films/companies, narrowed here to the ones that actually clash
+    constraint = crud.unique_violation(error)
+    if constraint is None:
+        return error
+    for key, value in values.items():
+        if not isinstance(value, str) and f"{{{key}}}" in DUPLICATE_DETAILS[constraint]:
+            # Empty if the other row went away since; name every candidate then
+            taken = await crud.run(db, crud.taken_values, constraint, value) or sorted({v for v, _ in value})
+            values[key] = ", ".join(taken)
+    return HTTPException(status_code=status_code, detail=DUPLICATE_DETAILS[constraint].format(**values))
+
+
+async def bulk_create(db, fn, schema, items: list[dict]) -> schemas.BulkResult:
+    # Items are validated one by one so a bad row is reported instead of failing the whole call
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ITEMS} items per bulk request")
+    results, valid = {}, []
+    for i, item in enumerate(items):
+        try:
+            valid.append((i, schema.model_validate(item)))
+        except ValidationError as e:
+            error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            results[i] = schemas.BulkItemResult(index=i, error=error)
+    try:
+        created = await crud.run(db, fn, [obj for _, obj in valid])
+    except IntegrityError:
+        # A concurrent writer won a uniqueness race; nothing from this batch was committed
+        raise HTTPException(status_code=409, detail="Bulk insert conflicted with a concurrent write, retry the batch")
+    for (i, _), (id, error) in zip(valid, created):
+        results[i] = schemas.BulkItemResult(index=i, id=id, error=error)
+    items = [results[i] for i in range(len(items))]
+    failed = sum(1 for item in items if item.error)
+    return schemas.BulkResult(created=len(items) - failed, failed=failed, items=items)
+
+
+@router.get("/api/users/{id}/", response_model=schemas.UserSchema, 
          response_model_exclude={'role'}, response_model_by_alias=False)
-def get_user(id: int, db: Session = Depends(get_db)):
-    db_user = crud.get_user(db, id=id)
-    if db_user is None:
-        raise HTTPException(status_code=404, detail=f"User with user id ({id}) not found")
-    return db_user
+async def get_user(id: int, request: Request, fields: str | None = None, include: str | None = None,
+                   db: Session = Depends(get_db)):
+    return await cached_detail(request, db, ("user", id), crud.get_user, schemas.UserSchema,
+                               f"User with user id ({id}) not found",
+                               sparse_fields("users", schemas.UserSchema, fields, include))
 
 
-@app.get("/api/api/users/email/{email}/", response_model=schemas.UserSchema, 
+@router.get("/api/api/users/email/{email}/", response_model=schemas.UserSchema, 
          response_model_exclude={'role'}, response_model_by_alias=False)
-def get_user_by_email(email: str, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=email)
+async def get_user_by_email(email: str, db: Session = Depends(get_db)):
+    db_user, body = await run_rendered(db, crud.get_user_by_email, partial(serializers.render, schemas.UserSchema),
+                                       email=email)
     if db_user is None:
         raise HTTPException(status_code=404, detail=f"User with email ({email}) not found")
-    return db_user
+    return json_response(body)
 
 
-@app.get("/api/users/", response_model=list[schemas.UserSchema], 
+@router.get("/api/users/", response_model=list[schemas.UserSchema], 
          response_model_exclude={'role'}, response_model_by_alias=False)
-def get_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_users(db, skip=skip, limit=limit)
+async def get_users(request: Request, skip: int = 0, limit: int = 100, after: str | None = None, sort: str = "id",
+                    fields: str | None = None, include: str | None = None, ids: list[int] | None = Depends(batch_ids),
+                    db: Session = Depends(get_db)):
+    sparse = sparse_fields("users", schemas.UserSchema, fields, include, sort)
+    if ids is not None:
+        return await paged(request, crud.get_users_by_ids, db, schemas.UserSchema, sparse, ids=ids)
+    return await paged(request, crud.get_users, db, schemas.UserSchema, sparse, skip=skip, limit=limit, after=after,
+                       sort=sort)
+
+
+@router.post("/api/users/", response_model=schemas.UserSchema, status_code=status.HTTP_201_CREATED)
+async def create_user(user: schemas.UserCreateSchema, response: Response, db: Session = Depends(get_db)):
+    try:
+        _, body = await run_rendered(db, crud.create_user, partial(serializers.render, schemas.UserSchema), user=user)
+        return json_response(body, status.HTTP_201_CREATED, response)
+    except IntegrityError as e:
+        raise await duplicate_error(db, e, email=user.email, title=[(f.film.title, None) for f in user.films or []],
+                                    name=[(c.company.name, None) for c in user.companies or []])
+
+
+@router.get("/api/users/export")
+async def export_users(format: typing.Literal["ndjson", "csv"] = "ndjson"):
+    return export_response("users", format)
+
+
+@router.post("/api/users/bulk", response_model=schemas.BulkResult)
+async def bulk_create_users(users: list[dict], db: Session = Depends(get_db)):
+    return await bulk_create(db, crud.bulk_create_users, schemas.UserCreateSimple, users)
 
 
-@app.post("/api/users/", response_model=schemas.UserSchema, status_code=status.HTTP_201_CREATED)
-def create_user(user: schemas.UserCreateSchema, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
-    if db_user:
-        raise HTTPException(status_code=400, detail=f"User with email `{user.email}` already registered")
-    return crud.create_user(db=db, user=user)
+def graph_links(via: typing.Literal["film", "company", "all"] = "all",
+                role: list[typing.Literal["director", "producer", "writer", "owner", "member"]] = Query(default=[])) -> dict:
+    # Which links count as a collaboration: through films, companies or both, optionally only with these roles
+    return {"via": ("film", "company") if via == "all" else (via,), "roles": tuple(role)}
 
 
-@app.post("/api/users/{id}/", response_model=schemas.UserSchema)
-def update_user(id: int, user: schemas.UserUpdateSchema, db: Session = Depends(get_db)):
-    db_user = crud.get_user(db, id=id)
+@router.get("/api/users/{id}/collaborators", response_model=list[schemas.CollaboratorSchema])
+async def get_collaborators(id: int, depth: int = 1, limit: int = 100, links: dict = Depends(graph_links),
+                            db: Session = Depends(get_db)):
+    if not 1 <= depth <= graph.MAX_COLLABORATOR_DEPTH:
+        raise HTTPException(status_code=400, detail=f"depth must be between 1 and {graph.MAX_COLLABORATOR_DEPTH}")
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    collaborators = await crud.run(db, crud.get_collaborators, id=id, depth=depth, limit=limit, **links)
+    if collaborators is None:
+        raise HTTPException(status_code=404, detail=f"User with user id ({id}) not found")
+    return collaborators
+
+
+@router.get("/api/users/{id}/path/{other_id}", response_model=list[schemas.CollaborationStepSchema])
+async def get_collaboration_path(id: int, other_id: int, max_depth: int = graph.MAX_PATH_DEPTH,
+                                 links: dict = Depends(graph_links), db: Session = Depends(get_db)):
+    if not 1 <= max_depth <= graph.MAX_PATH_DEPTH:
+        raise HTTPException(status_code=400, detail=f"max_depth must be between 1 and {graph.MAX_PATH_DEPTH}")
+    path = await crud.run(db, crud.get_collaboration_path, id=id, other_id=other_id, max_depth=max_depth, **links)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"User with user id ({id}) or ({other_id}) not found")
+    if not path:
+        raise HTTPException(status_code=404, detail=f"No collaboration path within {max_depth} hops")
+    return path
+
+
+@router.post("/api/users/{id}/", response_model=schemas.UserSchema)
+async def update_user(id: int, user: schemas.UserUpdateSchema, response: Response, db: Session = Depends(get_db)):
+    db_user = await crud.run(db, crud.get_user, id=id)
     if not db_user:
         raise HTTPException(status_code=400, detail=f"User with user id ({id}) not found")
     
@@ -69,7 +442,6 @@ def update_user(id: int, user: schemas.UserUpdateSchema, db: Session = Depends(g
         # db_fids = list(map(lambda x: x[0], db.query(models.Film.id).filter(models.Film.id.in_(fids)).all()))
         for fid in fids:
             if fid and not fid in existing_fids:
-                print("****This is wrong either by error or malnipulative attempt? ", fid)
                 raise HTTPException(status_code=400, detail=f"Suspicious operation identified with the list of Films")
         
     cids = list(map(lambda x: x.get('company', {}).get('id', None), user.dict().get('companies', [])))
@@ -78,70 +450,222 @@ def update_user(id: int, user: schemas.UserUpdateSchema, db: Session = Depends(g
     if len(cids) > 0:
         for cid in cids:
             if cid and not cid in existing_cids:
-                print("****This is wrong either by error or malnipulative attempt? ", cid)
                 raise HTTPException(status_code=400, detail=f"Suspicious operation identified with the list of Companies")
         
-    return crud.update_user_post(db=db, user=user)
-
-
-@app.patch("/api/users/{id}/", response_model=schemas.UserSchema)
-def update_user(id: int, user: schemas.UserUpdatePartialSchema, db: Session = Depends(get_db)):
-    db_user = crud.get_user(db, id=id)
-    if not db_user:
-        raise HTTPException(status_code=400, detail=f"User with user id ({id}) not found")
-    if user.id != id:
+    try:
+        _, body = await run_rendered(db, crud.update_user_post, partial(serializers.render, schemas.UserSchema),
+                                     user=user, db_user=db_user)
+        return json_response(body, response=response)
+    except StaleDataError:
+        raise HTTPException(status_code=409, detail=f"User with user id ({id}) was changed meanwhile, reload and retry")
+    except IntegrityError as e:
+        # A new or renamed film/company clashing with an existing one
+        raise await duplicate_error(db, e, status.HTTP_409_CONFLICT,
+                                    title=[(f.film.title, f.film.id) for f in user.films or []],
+                                    name=[(c.company.name, c.company.id) for c in user.companies or []])
+
+
+def if_match_version(if_match: str | None = Header(default=None)) -> int | None:
+    # If-Match carries the ETag of a previous GET (or just the version, e.g. 3); * or no header matches any.
+    # Only the version in it is compared: PATCH writes the user's own columns, which is what bumps it
+    if if_match is None or if_match.strip() == "*":
+        return None
+    version = etag_version(if_match)
+    if version is None:
+        raise HTTPException(status_code=412, detail="If-Match must be a strong ETag from GET /api/users/{id}/ or a version")
+    return version
+
+
+@router.patch("/api/users/{id}/", response_model=schemas.User)
+async def update_user(id: int, user: schemas.UserUpdatePartialSchema, version: int | None = Depends(if_match_version),
+                      db: Session = Depends(get_db)):
+    if user.id is not None and user.id != id:
         # To ensure consistency between the accessed and updated instance
         raise HTTPException(status_code=400, detail=f"Suspicious operation identified")
-    return crud.update_user_put(db=db, user=user)
+    # Only what the client sent; films and companies are edited through POST
+    values = user.model_dump(exclude_unset=True, include=crud.USER_PATCH_FIELDS)
+    if any(value is None for value in values.values()):
+        raise HTTPException(status_code=400, detail=f"{sorted(k for k, v in values.items() if v is None)} can't be null")
+    db_user = await crud.run(db, crud.patch_user, id=id, values=values, version=version)
+    if db_user is None:
+        current = await crud.run(db, crud.user_version, id=id)
+        if current is None:
+            raise HTTPException(status_code=400, detail=f"User with user id ({id}) not found")
+        raise HTTPException(status_code=412, detail=f"User is at version {current}, not {version}")
+    return db_user
 
 
 # ==================================Films URLs===================================
 
-@app.get("/api/films/{id}/", response_model=schemas.FilmSchema)
-def get_film(id: int, db: Session = Depends(get_db)):
-    db_film = crud.get_film(db, id=id)
-    if db_film is None:
-        raise HTTPException(status_code=404, detail=f"Film with film id ({id}) not found")
-    return db_film
+@router.get("/api/films/{id}/", response_model=schemas.FilmSchema)
+async def get_film(id: int, request: Request, fields: str | None = None, include: str | None = None,
+                   db: Session = Depends(get_db)):
+    return await cached_detail(request, db, ("film", id), crud.get_film, schemas.FilmSchema,
+                               f"Film with film id ({id}) not found",
+                               sparse_fields("films", schemas.FilmSchema, fields, include))
+
+
+def film_filters(genre: str | None = None, company_id: int | None = None,
+                 release_year_min: int | None = None, release_year_max: int | None = None,
+                 budget_min: int | None = None, budget_max: int | None = None) -> dict:
+    # Query parameters shared by the films list and export (see crud.filter_films)
+    return {k: v for k, v in locals().items() if v is not None}
+
 
+@router.get("/api/films/", response_model=list[schemas.FilmSchema])
+async def get_films(request: Request, skip: int = 0, limit: int = 100, after: str | None = None,
+                    sort: str | None = None, fields: str | None = None, include: str | None = None,
+                    filters: dict = Depends(film_filters), ids: list[int] | None = Depends(batch_ids),
+                    db: Session = Depends(get_db)):
+    # Without an explicit sort a range filter pages in its own column's order; an explicit
+    # sort no index can serve with the filters is a 400
+    sort = sort or crud.default_film_sort(filters)
+    sparse = sparse_fields("films", schemas.FilmSchema, fields, include, sort)
+    if ids is not None:
+        return await paged(request, crud.get_films_by_ids, db, schemas.FilmSchema, sparse, ids=ids)
+    return await paged(request, crud.get_films, db, schemas.FilmSchema, sparse, skip=skip, limit=limit, after=after,
+                       sort=sort, **filters)
 
-@app.get("/api/films/", response_model=list[schemas.FilmSchema])
-def get_films(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_films(db, skip=skip, limit=limit)
 
+@router.get("/api/films/stats", response_model=list[schemas.ReleaseYearStatsSchema] | list[schemas.CompanyStatsSchema])
+async def get_film_stats(group_by: typing.Literal["release_year", "company_id"] = "release_year",
+                         db: Session = Depends(get_db)):
+    return await crud.run(db, crud.get_film_stats, group_by=group_by)
 
-@app.post("/api/films/", response_model=schemas.FilmSchema, status_code=status.HTTP_201_CREATED)
-def create_film(film: schemas.FilmCreateSchema, db: Session = Depends(get_db)):
-    db_film = crud.get_film_title(db, title=film.title)
-    if db_film:
-        raise HTTPException(status_code=400, detail=f"Film with title `{film.title}` already registered")
-    return crud.create_film(db=db, film=film)
+
+@router.get("/api/crew/stats", response_model=list[schemas.CrewRoleStatsSchema])
+async def get_crew_stats(db: Session = Depends(get_db)):
+    return await crud.run(db, crud.get_crew_stats)
+
+
+@router.get("/api/films/search", response_model=list[schemas.FilmSchema])
+async def search_films(q: str, limit: int = 20, db: Session = Depends(get_db)):
+    if not search.tokenize(q):
+        raise HTTPException(status_code=400, detail="Search query must contain at least one word")
+    if not 1 <= limit <= search.SEARCH_MAX_RESULTS:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {search.SEARCH_MAX_RESULTS}")
+    _, body = await run_rendered(db, crud.search_films, partial(serializers.render_many, schemas.FilmSchema),
+                                 q=q, limit=limit)
+    return json_response(body)
+
+
+@router.post("/api/films/", response_model=schemas.FilmSchema, status_code=status.HTTP_201_CREATED)
+async def create_film(film: schemas.FilmCreateSchema, response: Response, db: Session = Depends(get_db)):
+    try:
+        _, body = await run_rendered(db, crud.create_film, partial(serializers.render, schemas.FilmSchema), film=film)
+        return json_response(body, status.HTTP_201_CREATED, response)
+    except IntegrityError as e:
+        raise await duplicate_error(db, e, title=film.title)
+
+
+@router.get("/api/films/export")
+async def export_films(format: typing.Literal["ndjson", "csv"] = "ndjson", filters: dict = Depends(film_filters)):
+    return export_response("films", format, **filters)
+
+
+@router.post("/api/films/bulk", response_model=schemas.BulkResult)
+async def bulk_create_films(films: list[dict], db: Session = Depends(get_db)):
+    return await bulk_create(db, crud.bulk_create_films, schemas.FilmCreateSimple, films)
 
 # ==================================Company URLs===================================
 
-@app.get("/api/companies/{id}/", response_model=schemas.CompanySchema)
-def get_company(id: int, db: Session = Depends(get_db)):
-    db_company = crud.get_company(db, id=id)
-    if db_company is None:
+@router.get("/api/companies/{id}/", response_model=schemas.CompanySchema)
+async def get_company(id: int, request: Request, fields: str | None = None, include: str | None = None,
+                      db: Session = Depends(get_db)):
+    return await cached_detail(request, db, ("company", id), crud.get_company, schemas.CompanySchema,
+                               f"Company with company id ({id}) not found",
+                               sparse_fields("companies", schemas.CompanySchema, fields, include))
+
+
+@router.get("/api/companies/{id}/stats", response_model=schemas.CompanyStatsSchema)
+async def get_company_stats(id: int, db: Session = Depends(get_db)):
+    company_stats = await crud.run(db, crud.get_company_stats, id=id)
+    if company_stats is None:
         raise HTTPException(status_code=404, detail=f"Company with company id ({id}) not found")
-    return db_company
+    return company_stats
+
+
+@router.get("/api/companies/", response_model=list[schemas.CompanySchema])
+async def get_companies(request: Request, skip: int = 0, limit: int = 100, after: str | None = None, sort: str = "id",
+                        fields: str | None = None, include: str | None = None,
+                        ids: list[int] | None = Depends(batch_ids), db: Session = Depends(get_db)):
+    sparse = sparse_fields("companies", schemas.CompanySchema, fields, include, sort)
+    if ids is not None:
+        return await paged(request, crud.get_companies_by_ids, db, schemas.CompanySchema, sparse, ids=ids)
+    return await paged(request, crud.get_companies, db, schemas.CompanySchema, sparse, skip=skip, limit=limit,
+                       after=after, sort=sort)
+
+
+@router.post("/api/companies/", response_model=schemas.CompanySchema, status_code=status.HTTP_201_CREATED)
+async def create_company(company: schemas.CompanyCreateSchema, response: Response, db: Session = Depends(get_db)):
+    try:
+        _, body = await run_rendered(db, crud.create_company, partial(serializers.render, schemas.CompanySchema),
+                                     company=company)
+        return json_response(body, status.HTTP_201_CREATED, response)
+    except IntegrityError as e:
+        raise await duplicate_error(db, e, name=company.name, title=[(f.title, None) for f in company.films or []])
+
+
+@router.get("/api/companies/export")
+async def export_companies(format: typing.Literal["ndjson", "csv"] = "ndjson"):
+    return export_response("companies", format)
+
+
+@router.post("/api/companies/bulk", response_model=schemas.BulkResult)
+async def bulk_create_companies(companies: list[dict], db: Session = Depends(get_db)):
+    return await bulk_create(db, crud.bulk_create_companies, schemas.CompanyCreateSimple, companies)
+
+
+# ==================================Ops URLs===================================
+
+@router.get("/api/ready")
+async def get_ready(request: Request):
+    if not request.app.state.ready:
+        raise HTTPException(status_code=503, detail="Starting up")
+    return {"ready": True, "startup_ms": request.app.state.startup_ms}
 
 
-@app.get("/api/companies/", response_model=list[schemas.CompanySchema])
-def get_companies(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_companies(db, skip=skip, limit=limit)
+@router.get("/api/pool/stats")
+async def get_pool_stats():
+    # Checked-out/overflow come from the pool itself; wait times cover this process since start
+    return {**database.pool_stats(database.request_engine()), "wait": database.pool_wait_stats.as_dict(),
+            "replicas": database.replicas.stats()}
 
 
-@app.post("/api/companies/", response_model=schemas.CompanySchema, status_code=status.HTTP_201_CREATED)
-def create_company(company: schemas.CompanyCreateSchema, db: Session = Depends(get_db)):
-    db_company = crud.get_company_by_name(db, name=company.name)
-    if db_company:
-        raise HTTPException(status_code=400, detail=f"Company with name `{company.name}` already exist, try editing")
-    return crud.create_company(db=db, company=company)
+@router.get("/api/cache/stats")
+async def get_cache_stats():
+    return response_cache.stats()
+
+
+@router.get("/api/coalesce/stats")
+async def get_coalesce_stats():
+    return coalesce.flights.stats()
+
+
+@router.get("/api/profiles")
+async def get_profiles(request: Request):
+    # Slowest first; once PROFILE_KEEP is reached the fastest one is dropped, files included
+    if not profiling.authorized(request.headers):
+        raise HTTPException(status_code=403, detail="Profiling token required")
+    return profiling.profile_store.slowest()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    pool = database.pool_stats(database.request_engine())
+    wait = database.pool_wait_stats.as_dict()
+    gauges = {f"pool_{k}": v for k, v in pool.items() if isinstance(v, (int, float))}
+    gauges["cache_entries"] = response_cache.stats()["entries"]
+    gauges["coalesce_in_flight"] = coalesce.flights.stats(top=0)["in_flight"]
+    counters = {"pool_checkouts_total": wait["checkouts"], "pool_timeouts_total": wait["timeouts"],
+                "pool_wait_seconds_total": wait["wait_total_ms"] / 1000,
+                "coalesce_leaders_total": coalesce.flights.leaders,
+                "coalesce_followers_total": coalesce.flights.followers}
+    return PlainTextResponse(metrics.registry.render(gauges, counters), media_type="text/plain; version=0.0.4")
 
 
 #  response_model_exclude={'role'}, response_model_by_alias=Fals
-# @app.put("/companies/{id}/", response_model=schemas.CompanyUpdate)
+# @router.put("/companies/{id}/", response_model=schemas.CompanyUpdate)
 # def update_company(company: schemas.CompanyUpdateSchema, db: Session = Depends(get_db)):
 #     # TODO
 #     db_company = crud.update_company(db, email=company.email)
@@ -151,4 +675,7 @@ def create_company(company: schemas.CompanyCreateSchema, db: Session = Depends(g
 
 # import uvicorn
 # if __name__ == "__main__":
-#     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+#     uvicorn.run(app, host="0.0.0.0", port=8000)
+
+
+app = create_app()
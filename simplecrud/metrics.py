@@ -0,0 +1,139 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from decouple import config
+from sqlalchemy import event
+
+# Cheap enough to leave on: two clock reads per SQL statement and a locked dict update per request
+METRICS_ENABLED = config("METRICS_ENABLED", default=True, cast=bool)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestTimings:
+    __slots__ = ("statements", "db", "serialize")
+
+    def __init__(self):
+        self.statements = 0
+        self.db = 0.0
+        self.serialize = 0.0
+
+    def server_timing(self, total: float) -> str:
+        # "app" is whatever is left: routing, validation and response_model serialization by FastAPI
+        app = max(total - self.db - self.serialize, 0.0)
+        return (f'db;dur={self.db * 1000:.2f};desc="{self.statements} queries", '
+                f"serialize;dur={self.serialize * 1000:.2f}, app;dur={app * 1000:.2f}, total;dur={total * 1000:.2f}")
+
+
+# Set by the middleware for the duration of a request; copied into threadpool workers
+# and async session greenlets, so engine events see the same object
+current_timings: ContextVar[RequestTimings | None] = ContextVar("current_timings", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Registry:
+    """Per-process request and query metrics, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}  # (method, route, status) -> count
+        self.statements = {}  # (method, route) -> count
+        self.durations = {}  # (method, route) -> Histogram
+        self.db_durations = {}  # (method, route) -> Histogram
+
+    def observe(self, method: str, route: str, status: int, seconds: float, timings: RequestTimings):
+        key = (method, route)
+        with self._lock:
+            self.requests[(method, route, status)] = self.requests.get((method, route, status), 0) + 1
+            self.statements[key] = self.statements.get(key, 0) + timings.statements
+            if key not in self.durations:
+                self.durations[key] = Histogram()
+                self.db_durations[key] = Histogram()
+            self.durations[key].observe(seconds)
+            self.db_durations[key].observe(timings.db)
+
+    def render(self, gauges: dict[str, float], counters: dict[str, float]) -> str:
+        lines = []
+        with self._lock:
+            lines += _family("simplecrud_http_requests_total", "counter", "Requests served.",
+                             ((_labels(method=m, route=r, status=s), n) for (m, r, s), n in self.requests.items()))
+            lines += _family("simplecrud_db_statements_total", "counter", "SQL statements executed by requests.",
+                             ((_labels(method=m, route=r), n) for (m, r), n in self.statements.items()))
+            lines += _histogram("simplecrud_http_request_duration_seconds", "Request latency up to the response headers.",
+                                self.durations)
+            lines += _histogram("simplecrud_db_duration_seconds", "Time spent executing SQL per request.",
+                                self.db_durations)
+        for kind, values in (("gauge", gauges), ("counter", counters)):
+            for name, value in values.items():
+                lines += _family(f"simplecrud_{name}", kind, "", [("", value)])
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels) -> str:
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _family(name: str, kind: str, help: str, samples) -> list[str]:
+    lines = [f"# HELP {name} {help}"] if help else []
+    lines.append(f"# TYPE {name} {kind}")
+    lines += [f"{name}{labels} {value}" for labels, value in samples]
+    return lines
+
+
+def _histogram(name: str, help: str, histograms: dict) -> list[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+    for (method, route), hist in histograms.items():
+        cumulative = 0
+        for bound, count in zip((*hist.buckets, "+Inf"), hist.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(method=method, route=route, le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(method=method, route=route)} {hist.sum}")
+        lines.append(f"{name}_count{_labels(method=method, route=route)} {cumulative}")
+    return lines
+
+
+registry = Registry()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_timings.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = current_timings.get()
+    if timings is not None and conn.info.get("query_start"):
+        timings.db += time.perf_counter() - conn.info["query_start"].pop()
+        timings.statements += 1
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+def instrument(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def add_serialize_time(seconds: float):
+    timings = current_timings.get()
+    if timings is not None:
+        timings.serialize += seconds
@@ -0,0 +1,47 @@
+"""Backfill film_genre from the legacy pickled `films.genres` column.
+
+    python -m simplecrud.migrate_genres [--batch-size 1000] [--after-id 0]
+
+Each batch is its own short transaction keyed on the primary key, so the
+films table is never locked for long and the run can be resumed with
+--after-id (re-running a batch is harmless, inserts ignore duplicates).
+Drop the legacy column once the backfill has finished.
+"""
+import argparse
+import pickle
+
+from sqlalchemy import inspect, text
+
+from simplecrud import models
+from simplecrud.database import get_engine
+
+
+def backfill(batch_size: int = 1000, after_id: int = 0) -> int:
+    engine = get_engine()
+    if "genres" not in {c["name"] for c in inspect(engine).get_columns("films")}:
+        print("films.genres does not exist, nothing to backfill")
+        return 0
+
+    migrated = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text("SELECT id, genres FROM films WHERE id > :after AND genres IS NOT NULL ORDER BY id LIMIT :n"),
+                {"after": after_id, "n": batch_size},
+            ).all()
+            if not rows:
+                break
+            models.link_genres(conn, {id: pickle.loads(blob) or [] for id, blob in rows})
+            after_id = rows[-1].id
+            migrated += len(rows)
+        print(f"Backfilled {migrated} films (last id {after_id})")
+    return migrated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--after-id", type=int, default=0)
+    args = parser.parse_args()
+    models.Base.metadata.create_all(bind=get_engine())
+    backfill(args.batch_size, args.after_id)
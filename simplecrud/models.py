@@ -1,9 +1,39 @@
-from sqlalchemy import Column, ForeignKey, Integer, String
-from sqlalchemy.orm import relationship
-from sqlalchemy.ext.mutable import MutableList
-from sqlalchemy import PickleType
+from itertools import chain
 
-from .database import Base
+from sqlalchemy import (
+    DDL, BigInteger, Column, ForeignKey, Index, Integer, String, Table, UniqueConstraint, event, func, literal_column,
+    select,
+)
+from sqlalchemy.orm import Session, relationship
+from sqlalchemy.orm.attributes import flag_dirty
+
+from .database import Base, insert_ignore
+
+
+film_genre = Table(
+    "film_genre",
+    Base.metadata,
+    Column("film_id", ForeignKey("films.id", ondelete="CASCADE"), primary_key=True),
+    Column("genre_id", ForeignKey("genres.id", ondelete="CASCADE"), primary_key=True),
+    # genre -> films lookups (the ?genre= filter) are a range scan on this index
+    Index("ix_film_genre_genre_id_film_id", "genre_id", "film_id"),
+)
+
+
+class Genre(Base):
+    __tablename__ = "genres"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(64), unique=True, nullable=False)
+
+
+# Unique constraints the create paths rely on instead of reading first, with the
+# text SQLite puts in its error for each (Postgres reports the name itself)
+UNIQUE_CONSTRAINTS = {
+    "uq_users_email_lower": "uq_users_email_lower",
+    "uq_films_title": "films.title",
+    "uq_companies_name": "companies.name",
+}
 
 
 class FilmCrewMembers(Base):
@@ -14,6 +44,9 @@ class FilmCrewMembers(Base):
     film = relationship("Film", back_populates="crew_members")
     user = relationship("User", back_populates="films")
 
+    # The primary key covers user -> films; the collaboration graph also walks film -> users
+    __table_args__ = (Index("ix_user_film_film_id_user_id", "film_id", "user_id"),)
+
 
 class CompanyStaff(Base):
     __tablename__ = 'company_user'
@@ -23,6 +56,8 @@ class CompanyStaff(Base):
     company = relationship("Company", back_populates="staff")
     user = relationship("User", back_populates="companies")
 
+    __table_args__ = (Index("ix_company_user_company_id_user_id", "company_id", "user_id"),)
+
 
 class User(Base):
     __tablename__ = "users"
@@ -30,43 +65,177 @@ class User(Base):
     id = Column(Integer, primary_key=True)
     first_name = Column(String(64), index=True)
     last_name = Column(String(64), index=True)
-    email = Column(String(254), index=True)
+    email = Column(String(254))
     minimun_fee = Column(Integer, default=0)
+    # Bumped by every update; PATCH compares it against If-Match instead of locking the row
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     # n-n reverse
     films = relationship(FilmCrewMembers, back_populates="user")
     companies = relationship(CompanyStaff, back_populates="user")
 
+    # ORM flushes check and bump version too, so a full update racing a PATCH fails instead of overwriting it
+    __mapper_args__ = {"version_id_col": version}
+
+    __table_args__ = (
+        # Keyset pagination indexes: (sort column, id) keeps every page a range scan
+        Index("ix_users_last_name_id", "last_name", "id"),
+        # One account per address regardless of case; also serves get_user_by_email
+        Index("uq_users_email_lower", func.lower(email), unique=True),
+    )
+
+
+# Films are searched through a GIN expression index on Postgres (see search.py); the
+# query must build its document with this same function for the planner to use it
+SEARCH_CONFIG = literal_column("'simple'::regconfig")
+
+
+def film_search_document(title, description):
+    empty = literal_column("''")
+    return func.setweight(func.to_tsvector(SEARCH_CONFIG, func.coalesce(title, empty)), literal_column("'A'")).op("||")(
+        func.setweight(func.to_tsvector(SEARCH_CONFIG, func.coalesce(description, empty)), literal_column("'B'")))
+
 
 class Film(Base):
     __tablename__ = "films"
 
     id = Column(Integer, primary_key=True)
-    title = Column(String(32), index=True, nullable=False)
+    title = Column(String(32), nullable=False)
     description = Column(String, nullable=True)
     budget = Column(Integer, index=True, default=0)
     release_year = Column(Integer, index=True, nullable=False)
-    genres = Column(MutableList.as_mutable(PickleType), default=[])
+    # Normalized through film_genre; `genres` below keeps the list[str] interface. A film's
+    # genres are a set, kept and returned in name order whatever order they were given in
+    genre_rows = relationship(Genre, secondary=film_genre, order_by=Genre.name)
     # Foreignkey Relation
     company_id = Column(Integer, ForeignKey("companies.id"))
     company = relationship("Company", back_populates="films")
     # n-n reverse
     crew_members = relationship(FilmCrewMembers, back_populates="film")
 
+    __table_args__ = (
+        UniqueConstraint("title", name="uq_films_title"),
+        # Keyset pagination indexes: (sort column, id) keeps every page a range scan
+        Index("ix_films_title_id", "title", "id"),
+        Index("ix_films_budget_id", "budget", "id"),
+        Index("ix_films_release_year_id", "release_year", "id"),
+        # List filters (crud.film_sorts): a company's films in each sort order, also with a range on it
+        Index("ix_films_company_id_id", "company_id", "id"),
+        Index("ix_films_company_id_title_id", "company_id", "title", "id"),
+        Index("ix_films_company_id_budget_id", "company_id", "budget", "id"),
+        Index("ix_films_company_id_release_year_id", "company_id", "release_year", "id"),
+        # Search: full text over title + description, trigrams on the title for typos
+        Index("ix_films_search", film_search_document(title, description), postgresql_using="gin").ddl_if(
+            dialect="postgresql"),
+        Index("ix_films_title_trgm", title, postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}).ddl_if(
+            dialect="postgresql"),
+    )
+
+    @property
+    def genres(self) -> list[str]:
+        pending = getattr(self, "_pending_genres", None)
+        if pending is not None:
+            return list(pending)
+        return [genre.name for genre in self.genre_rows]
+
+    @genres.setter
+    def genres(self, names: list[str] | None):
+        # Names are resolved to Genre rows in bulk at flush time (see resolve_pending_genres)
+        self._pending_genres = sorted(set(names or []))
+        # Puts persistent films in session.dirty so the next flush picks the names up
+        flag_dirty(self)
+
+
+event.listen(Film.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+
 
 class Company(Base):
     __tablename__ = "companies"
 
     id = Column(Integer, primary_key=True)
-    name = Column(String(32), index=True, nullable=False)
+    name = Column(String(32), nullable=False)
     contact_email_address = Column(String(254), index=True)
     phone_number = Column(String(15), index=True)
     # 1-n reverse
     films = relationship("Film", back_populates="company") 
     # n-n reverse
     staff = relationship(CompanyStaff, back_populates="company") 
+
+    __table_args__ = (
+        UniqueConstraint("name", name="uq_companies_name"),
+        # Keyset pagination index: (sort column, id) keeps every page a range scan
+        Index("ix_companies_name_id", "name", "id"),
+    )
     
     # staff = relationship('User',
     #                       secondary=CompanyMembersAssociation,
     #                       back_populates='companies',
     #                       cascade='all, delete'
-    #                 )
\ No newline at end of file
+    #                 )
+
+
+# Aggregates behind the /stats endpoints, kept current by stats.py on every write
+# (rebuild with `simplecrud rebuild-stats`). Reads cost O(groups), not O(films).
+company_stats = Table(
+    "company_stats",
+    Base.metadata,
+    Column("company_id", ForeignKey("companies.id", ondelete="CASCADE"), primary_key=True),
+    Column("film_count", BigInteger, nullable=False),
+    Column("total_budget", BigInteger, nullable=False),
+)
+release_year_stats = Table(
+    "release_year_stats",
+    Base.metadata,
+    Column("release_year", Integer, primary_key=True, autoincrement=False),
+    Column("film_count", BigInteger, nullable=False),
+    Column("total_budget", BigInteger, nullable=False),
+)
+crew_role_stats = Table(
+    "crew_role_stats",
+    Base.metadata,
+    Column("role", String(16), primary_key=True),
+    Column("member_count", BigInteger, nullable=False),
+)
+
+
+GENRE_CHUNK_SIZE = 500  # like crud.IN_CHUNK_SIZE
+
+
+def _chunks(names) -> list[list[str]]:
+    names = sorted(names)
+    return [names[i:i + GENRE_CHUNK_SIZE] for i in range(0, len(names), GENRE_CHUNK_SIZE)]
+
+
+@event.listens_for(Session, "before_flush")
+def resolve_pending_genres(session, flush_context, instances):
+    films = [
+        obj for obj in chain(session.new, session.dirty)
+        if isinstance(obj, Film) and getattr(obj, "_pending_genres", None) is not None
+    ]
+    if not films:
+        return
+    names = set(chain.from_iterable(film._pending_genres for film in films))
+    by_name = {}
+    if names:
+        conn = session.connection()
+        # Concurrent writers may add the same genre; let the unique constraint arbitrate
+        conn.execute(insert_ignore(Genre.__table__, conn.dialect.name, ["name"]), [{"name": n} for n in names])
+        by_name = {genre.name: genre for chunk in _chunks(names)
+                   for genre in session.scalars(select(Genre).where(Genre.name.in_(chunk)))}
+    for film in films:
+        film.genre_rows = [by_name[name] for name in film._pending_genres]
+        film._pending_genres = None
+
+
+def link_genres(conn, film_genres: dict[int, list[str]]):
+    # Core counterpart of resolve_pending_genres for paths that insert films without the ORM
+    names = {name for genres in film_genres.values() for name in genres}
+    if not names:
+        return
+    dialect = conn.dialect.name
+    conn.execute(insert_ignore(Genre.__table__, dialect, ["name"]), [{"name": n} for n in names])
+    ids = {name: id for chunk in _chunks(names)
+           for name, id in conn.execute(select(Genre.name, Genre.id).where(Genre.name.in_(chunk)))}
+    conn.execute(
+        insert_ignore(film_genre, dialect, ["film_id", "genre_id"]),
+        [{"film_id": film_id, "genre_id": ids[n]} for film_id, genres in film_genres.items() for n in dict.fromkeys(genres)],
+    )
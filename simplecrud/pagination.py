@@ -0,0 +1,80 @@
+import base64
+import json
+from typing import Any, NamedTuple
+
+from sqlalchemy import tuple_
+
+
+class PaginationError(ValueError):
+    pass
+
+
+class Page(NamedTuple):
+    items: list
+    next_cursor: str | None
+
+
+def encode_cursor(sort: str, value: Any, id: int) -> str:
+    raw = json.dumps([sort, value, id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple[Any, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise PaginationError("Malformed pagination cursor")
+    if cursor_sort != sort:
+        # A cursor is only meaningful for the ordering it was issued with
+        raise PaginationError(f"Cursor was issued for sort `{cursor_sort}`, not `{sort}`")
+    return value, id
+
+
+def sort_column(columns: dict, sort: str):
+    column = columns.get(sort.removeprefix("-"))
+    if column is None:
+        raise PaginationError(f"Unsupported sort `{sort}`, expected one of {sorted(columns)}")
+    return column
+
+
+def keyset(query, columns: dict, sort: str = "id", after: str | None = None):
+    """The query in (sort column, primary key) order, positioned after the `after` cursor.
+
+    Returns (query, sort column); see paginate for the rules.
+    """
+    descending = sort.startswith("-")
+    id_column = columns["id"]
+    column = sort_column(columns, sort)
+    keys = [id_column] if column is id_column else [column, id_column]
+
+    if after:
+        value, id = decode_cursor(after, sort)
+        position, bound = (id_column, id) if len(keys) == 1 else (tuple_(*keys), tuple_(value, id))
+        query = query.filter(position < bound if descending else position > bound)
+
+    return query.order_by(*[k.desc() if descending else k.asc() for k in keys]), column
+
+
+def paginate(query, columns: dict, sort: str = "id", after: str | None = None, limit: int = 100, skip: int = 0) -> Page:
+    """Keyset pagination over (sort column, primary key).
+
+    `columns` maps the public sort keys to indexed columns and must contain the
+    primary key as "id"; a `-` prefix on `sort` means descending. The `after`
+    cursor turns into a row-value comparison so every page is an index range
+    scan. `skip` is only honoured when no cursor is given (legacy clients).
+    """
+    if limit < 1:
+        raise PaginationError("limit must be a positive integer")
+    query, column = keyset(query, columns, sort, after)
+    if skip and not after:
+        query = query.offset(skip)
+    # Fetch one extra row to know whether there is a next page without a COUNT
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, getattr(last, column.key), getattr(last, columns["id"].key))
+    return Page(rows, next_cursor)
@@ -0,0 +1,206 @@
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from decouple import config
+from sqlalchemy import event
+
+# A request is profiled when it sends `X-Profile: <PROFILE_TOKEN>` or is picked by
+# PROFILE_SAMPLE_RATE. Both are off by default; the hooks cost a contextvar read when idle.
+PROFILE_TOKEN = config("PROFILE_TOKEN", default="")
+PROFILE_SAMPLE_RATE = config("PROFILE_SAMPLE_RATE", default=0.0, cast=float)
+PROFILE_DIR = config("PROFILE_DIR", default="profiles")
+PROFILE_KEEP = config("PROFILE_KEEP", default=20, cast=int)
+
+PROFILE_HEADER = "x-profile"
+CRUD_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "crud.py")
+
+# cProfile hooks are per thread and the event loop thread is shared, so only one
+# request is profiled at a time; others arriving meanwhile simply aren't
+_active = threading.Lock()
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.time()
+        self.duration = 0.0
+        self.statements = []  # (sql, seconds, crud.py location)
+        self.profiles = [cProfile.Profile()]
+        self._statement_start = {}
+
+    def call(self, fn):
+        # Profiles fn in whatever thread it ends up running in (crud.run's threadpool).
+        # From 3.12 cProfile sees every thread already and refuses a second profiler.
+        if sys.version_info >= (3, 12):
+            return fn
+
+        def profiled(*args, **kwargs):
+            profile = cProfile.Profile()
+            self.profiles.append(profile)
+            return profile.runcall(fn, *args, **kwargs)
+        return profiled
+
+    def stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self.profiles[0])
+        for profile in self.profiles[1:]:
+            if profile.getstats():
+                stats.add(profile)
+        return stats
+
+    def summary(self) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "started": self.started,
+            "duration_ms": round(self.duration * 1000, 3),
+            "statements": len(self.statements),
+            "db_ms": round(sum(s[1] for s in self.statements) * 1000, 3),
+        }
+
+
+current_profile: ContextVar[RequestProfile | None] = ContextVar("current_profile", default=None)
+
+
+def authorized(headers) -> bool:
+    token = headers.get(PROFILE_HEADER)
+    return bool(PROFILE_TOKEN) and token is not None and hmac.compare_digest(token, PROFILE_TOKEN)
+
+
+def should_profile(headers) -> bool:
+    return authorized(headers) or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+
+
+def start(method: str, path: str) -> RequestProfile | None:
+    if not _active.acquire(blocking=False):
+        return None
+    profile = RequestProfile(method, path)
+    profile.profiles[0].enable()
+    return profile
+
+
+def stop(profile: RequestProfile, duration: float):
+    profile.profiles[0].disable()
+    profile.duration = duration
+    _active.release()
+
+
+def wrap(fn):
+    profile = current_profile.get()
+    return fn if profile is None else profile.call(fn)
+
+
+def crud_location() -> str | None:
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_code.co_filename == CRUD_FILE:
+            return f"crud.py:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    if profile is not None:
+        profile._statement_start[id(cursor)] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    if profile is not None and id(cursor) in profile._statement_start:
+        elapsed = time.perf_counter() - profile._statement_start.pop(id(cursor))
+        profile.statements.append((statement, elapsed, crud_location()))
+
+
+def instrument(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def collapsed_stacks(stats: pstats.Stats) -> list[str]:
+    """Folded stacks ("a;b;c <microseconds>") for flamegraph.pl, speedscope or inferno.
+
+    cProfile only keeps caller -> callee totals, so a function called from several
+    places has its time split between them in proportion to those totals.
+    """
+    entries = stats.stats
+    callees = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    def label(func):
+        filename, line, name = func
+        return f"{name} ({os.path.basename(filename)}:{line})" if line else name
+
+    folded = {}
+
+    def visit(func, stack, on_stack, share):
+        _, _, own, total, _ = entries[func]
+        if total * share < 1e-6:
+            return
+        stack = stack + (label(func),)
+        if own * share > 0:
+            folded[stack] = folded.get(stack, 0) + own * share
+        for callee, edge_total in callees.get(func, ()):
+            callee_total = entries[callee][3]
+            if callee not in on_stack and callee_total:
+                visit(callee, stack, on_stack | {callee}, share * edge_total / callee_total)
+
+    roots = [func for func, entry in entries.items() if not entry[4]]
+    if not roots and entries:
+        # Enabled from inside a coroutine every function has a caller; start from the outermost
+        roots = [max(entries, key=lambda func: entries[func][3])]
+    for root in roots:
+        visit(root, (), {root}, 1.0)
+    return [f"{';'.join(stack)} {round(seconds * 1e6)}" for stack, seconds in folded.items() if seconds >= 1e-6]
+
+
+class ProfileStore:
+    """Writes finished profiles to PROFILE_DIR and keeps the slowest PROFILE_KEEP of them."""
+
+    def __init__(self, directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._recent = deque()
+
+    def save(self, profile: RequestProfile) -> dict:
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(profile.started))}-{os.getpid()}-{id(profile):x}"
+        base = os.path.join(self.directory, name)
+        stats = profile.stats()
+        stats.dump_stats(f"{base}.prof")
+        with open(f"{base}.folded", "w") as f:
+            f.write("\n".join(collapsed_stacks(stats)) + "\n")
+        summary = {**profile.summary(), "files": {"pstats": f"{base}.prof", "folded": f"{base}.folded",
+                                                  "sql": f"{base}.sql.json"}}
+        with open(f"{base}.sql.json", "w") as f:
+            json.dump({**summary, "queries": [{"sql": sql, "ms": round(seconds * 1000, 3), "source": source}
+                                              for sql, seconds, source in profile.statements]}, f, indent=2)
+        with self._lock:
+            self._recent.append(summary)
+            if len(self._recent) > self.keep:
+                # Drop the fastest one, files included, so the directory stays bounded too
+                fastest = min(self._recent, key=lambda s: s["duration_ms"])
+                self._recent.remove(fastest)
+                for path in fastest["files"].values():
+                    if os.path.exists(path):
+                        os.remove(path)
+        return summary
+
+    def slowest(self) -> list[dict]:
+        with self._lock:
+            return sorted(self._recent, key=lambda s: s["duration_ms"], reverse=True)
+
+
+profile_store = ProfileStore()
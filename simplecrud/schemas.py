@@ -1,4 +1,5 @@
-from pydantic import BaseModel as _BaseModel, root_validator, EmailStr, Field, PositiveInt, validator
+from functools import lru_cache
+from pydantic import BaseModel as _BaseModel, root_validator, create_model, EmailStr, Field, PositiveInt, validator
 from pydantic.fields import FieldInfo
 # from pydantic.utils import GetterDict
 from pydantic._internal._model_construction import ModelMetaclass
@@ -42,6 +43,7 @@ class UserUpdatePartial(BaseModel):
 class User(UserBase):
     id: int
     email: EmailStr
+    version: int  # send back as If-Match on PATCH
       
 
 class CompanyBase(BaseModel):
@@ -162,6 +164,53 @@ class FilmSchema(Film):
     crew_members: list[FilmUserSchema]  # n-n
 
 
+@lru_cache(maxsize=None)
+def sparse_schema(schema: type[BaseModel], names: tuple[str, ...]) -> type[BaseModel]:
+    # `schema` cut down to `names`, for responses to ?fields= / ?include=
+    return create_model(f"{schema.__name__}Sparse", __base__=BaseModel,
+                        **{name: (schema.model_fields[name].annotation, schema.model_fields[name]) for name in names})
+
+
+# ================ Stats Schemas ===============
+
+
+class CompanyStatsSchema(BaseModel):
+    company_id: int
+    film_count: int
+    total_budget: int
+
+
+class ReleaseYearStatsSchema(BaseModel):
+    release_year: int
+    film_count: int
+    total_budget: int
+
+
+class CrewRoleStatsSchema(BaseModel):
+    role: str
+    member_count: int
+
+
+# ================ Graph Schemas ===============
+
+
+class CollaboratorSchema(BaseModel):
+    id: int
+    first_name: str
+    last_name: str
+    distance: int  # collaboration hops from the requested user
+
+
+class CollaborationStepSchema(BaseModel):
+    id: int
+    first_name: str
+    last_name: str
+    # The film or company linking this user to the previous one; unset on the first step
+    via: Literal['film', 'company'] | None = None
+    via_id: int | None = None
+    via_name: str | None = None
+
+
 # ================ Create Schemas ===============
 
 
@@ -225,6 +274,38 @@ class CompanyUpdateSchema(CompanyUpdate):
 class FilmUpdateSchema(Film):
     crew_members: list[FilmUserUpdateSchema] | None = []  # n-n
 
+# ================ Bulk Schemas ===============
+
+
+class BulkItemResult(BaseModel):
+    index: int  # position in the submitted list
+    id: int | None = None
+    error: str | None = None
+
+class BulkResult(BaseModel):
+    created: int
+    failed: int
+    items: list[BulkItemResult]
+
+
+# ================ Import Schemas ===============
+# Dataset rows reference each other by natural key (email, title, name), not by id
+
+
+class FilmImportSchema(FilmCreateSimple):
+    company_name: str | None = None
+
+class FilmCrewImportSchema(BaseModel):
+    role: Literal['director', 'producer', 'writer']
+    user_email: EmailStr
+    film_title: str
+
+class CompanyStaffImportSchema(BaseModel):
+    role: Literal['owner', 'member']
+    user_email: EmailStr
+    company_name: str
+
+
 # ============ Partial Update ===============
 # https://github.com/pydantic/pydantic/issues/6381/
 
@@ -0,0 +1,276 @@
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import chain
+
+from decouple import config
+from sqlalchemy import event, func, or_, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+from . import models
+
+SEARCH_MAX_RESULTS = 100
+# Title words count three times as much as description words
+TITLE_WEIGHT, DESCRIPTION_WEIGHT = 3.0, 1.0
+PREFIX_MATCH, FUZZY_MATCH = 0.8, 0.6
+MAX_EXPANSIONS = 50
+MIN_SIMILARITY = 0.4
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str | None) -> list[str]:
+    return _WORD.findall(text.casefold()) if text else []
+
+
+def _trigrams(token: str) -> set[str]:
+    # Same padding as pg_trgm, so "similarity" means the same thing on both backends
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# ================ Postgres ===============
+# Full text over title + description through the ix_films_search GIN expression index,
+# plus trigram similarity on the title (ix_films_title_trgm) to forgive typos.
+
+def _search_postgres(db, q: str, limit: int, options) -> list:
+    terms = tokenize(q)
+    document = models.film_search_document(models.Film.title, models.Film.description)
+    query = func.to_tsquery(models.SEARCH_CONFIG, " & ".join(f"{term}:*" for term in terms))
+    rank = func.ts_rank(document, query) + func.similarity(models.Film.title, q)
+    stmt = (
+        select(models.Film)
+        .options(*options)
+        .where(or_(document.bool_op("@@")(query), models.Film.title.bool_op("%")(q)))
+        .order_by(rank.desc(), models.Film.id)
+        .limit(limit)
+    )
+    return db.scalars(stmt).all()
+
+
+# ================ In-process index ===============
+# For databases without usable full-text search (SQLite in development). Built from
+# the films table on the first search. This worker's own film writes are applied when
+# they commit (ORM writes through the hooks below, bulk_create_films via index_films).
+# Each search first picks up films with a higher id than it has seen (other workers,
+# the importer), which is a primary key range scan. Every SEARCH_RESYNC_SECONDS a
+# background thread re-reads the whole table to pick up edits from elsewhere and ids
+# that committed late, so no search request pays for a full read.
+
+# How stale another worker's edits may get in this worker's index
+SEARCH_RESYNC_SECONDS = config("SEARCH_RESYNC_SECONDS", default=60.0, cast=float)
+
+
+def _weights(title: str | None, description: str | None) -> dict[str, float]:
+    weights = {}
+    for token in tokenize(description):
+        weights[token] = DESCRIPTION_WEIGHT
+    for token in tokenize(title):
+        weights[token] = TITLE_WEIGHT
+    return weights
+
+
+class FilmIndex:
+    def __init__(self, resync_seconds: float = SEARCH_RESYNC_SECONDS):
+        self._lock = threading.Lock()
+        self._resync_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.resync_seconds = resync_seconds
+        self.built = False
+        self.synced_at = 0.0
+        self.max_id = 0
+        self.documents = {}  # film id -> {token: weight}, to take a film's postings out again
+        self.postings = {}  # token -> {film id: weight}
+        self.vocabulary = []  # sorted tokens, for prefix matches
+        self.trigrams = {}  # trigram -> {token}, for typo matches
+        self._touched = None  # ids added while a resync scans, which it mustn't drop
+
+    def add(self, id: int, title: str | None, description: str | None):
+        # Adds the film or, if it is indexed already, replaces what was indexed for it
+        weights = _weights(title, description)
+        with self._lock:
+            if self._touched is not None:
+                self._touched.add(id)
+            old = self.documents.get(id)
+            if old == weights:
+                return
+            if old:
+                self._unpost(id, old.keys() - weights.keys())
+            for token, weight in weights.items():
+                if token not in self.postings:
+                    self.postings[token] = {}
+                    insort(self.vocabulary, token)
+                    for trigram in _trigrams(token):
+                        self.trigrams.setdefault(trigram, set()).add(token)
+                self.postings[token][id] = weight
+            self.documents[id] = weights
+            self.max_id = max(self.max_id, id)
+
+    def remove(self, id: int):
+        with self._lock:
+            self._unpost(id, self.documents.pop(id, {}))
+
+    def _unpost(self, id: int, tokens):
+        for token in tokens:
+            films = self.postings[token]
+            films.pop(id, None)
+            if not films:
+                del self.postings[token]
+                del self.vocabulary[bisect_left(self.vocabulary, token)]
+                for trigram in _trigrams(token):
+                    self.trigrams[trigram].discard(token)
+                    if not self.trigrams[trigram]:
+                        del self.trigrams[trigram]
+
+    def _scan(self, db, after: int, batch_size: int):
+        # (id, title, description) of every film with an id above `after`, in id batches
+        while True:
+            rows = db.execute(
+                select(models.Film.id, models.Film.title, models.Film.description)
+                .where(models.Film.id > after).order_by(models.Film.id).limit(batch_size)
+            ).all()
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            after = rows[-1].id
+
+    def catch_up(self, db, batch_size: int = 10_000):
+        if not self.built:
+            with self._resync_lock:
+                if not self.built:
+                    self._resync(db, batch_size)
+            return
+        for row in self._scan(db, self.max_id, batch_size):
+            self.add(*row)
+
+    def resync(self, db, batch_size: int = 10_000):
+        # Reconciles with the whole table: edited films are re-indexed, deleted ones dropped
+        with self._resync_lock:
+            self._resync(db, batch_size)
+
+    def _resync(self, db, batch_size: int):
+        seen, high = set(), 0
+        with self._lock:
+            self._touched = set()
+        try:
+            for row in self._scan(db, 0, batch_size):
+                seen.add(row.id)
+                high = row.id
+                self.add(*row)
+        finally:
+            with self._lock:
+                touched, self._touched = self._touched, None
+        # Films above the last id read committed after the scan got there, and films indexed
+        # meanwhile (this worker's commits) may have been passed over; neither is gone
+        with self._lock:
+            gone = [id for id in self.documents.keys() - seen - touched if id <= high]
+        for id in gone:
+            self.remove(id)
+        self.built = True
+        self.synced_at = time.monotonic()
+
+    def start(self, session_factory):
+        # Resyncs in a daemon thread from now on, once a search has built the index
+        self._stop.clear()
+        threading.Thread(target=self._watch, args=(session_factory,), name="film-index-resync", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self, session_factory):
+        while not self._stop.wait(self.resync_seconds):
+            if not self.built:
+                continue
+            try:
+                with session_factory() as db:
+                    self.resync(db)
+            except SQLAlchemyError:
+                pass  # The next round tries again; searches keep the index they have meanwhile
+
+    def _expand(self, term: str) -> dict[str, float]:
+        # Indexed tokens a query term stands for, with how well each one matches
+        matches = {}
+        if term in self.postings:
+            matches[term] = 1.0
+        start = bisect_left(self.vocabulary, term)
+        for token in self.vocabulary[start:start + MAX_EXPANSIONS]:
+            if not token.startswith(term):
+                break
+            matches.setdefault(token, PREFIX_MATCH)
+        if not matches and len(term) >= 3:
+            wanted = _trigrams(term)
+            shared = Counter(token for trigram in wanted for token in self.trigrams.get(trigram, ()))
+            for token, count in shared.most_common(MAX_EXPANSIONS):
+                similarity = count / len(wanted | _trigrams(token))
+                if similarity >= MIN_SIMILARITY:
+                    matches[token] = FUZZY_MATCH * similarity
+        return matches
+
+    def search(self, q: str, limit: int) -> list[tuple[int, float]]:
+        scores = Counter()
+        with self._lock:
+            for term in dict.fromkeys(tokenize(q)):
+                best = {}
+                for token, quality in self._expand(term).items():
+                    for id, weight in self.postings[token].items():
+                        best[id] = max(best.get(id, 0.0), weight * quality)
+                scores.update(best)
+        return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+film_index = FilmIndex()
+
+
+def index_films(films, removed=()):
+    # Called once film writes commit; until the first search builds the index there is nothing to keep up to date
+    if film_index.built:
+        for id, title, description in films:
+            film_index.add(id, title, description)
+        for id in removed:
+            film_index.remove(id)
+
+
+# ORM writes (new films, title/description edits, deletes) are collected per flush and
+# applied to the index once the transaction commits; a rollback drops them
+@event.listens_for(Session, "after_flush")
+def track_film_edits(session, flush_context):
+    films = [obj for obj in chain(session.new, session.dirty, session.deleted) if isinstance(obj, models.Film)]
+    if not films:
+        return
+    changed, removed = session.info.setdefault("search_changes", ({}, set()))
+    for film in films:
+        if film in session.deleted:
+            changed.pop(film.id, None)
+            removed.add(film.id)
+        elif film in session.new or get_history(film, "title").has_changes() or get_history(
+                film, "description").has_changes():
+            changed[film.id] = (film.id, film.title, film.description)
+
+
+@event.listens_for(Session, "after_commit")
+def apply_film_edits(session):
+    changes = session.info.pop("search_changes", None)
+    if changes:
+        index_films(changes[0].values(), changes[1])
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_film_edits(session):
+    session.info.pop("search_changes", None)
+
+
+def search_films(db, q: str, limit: int, options=()) -> list:
+    if db.get_bind().dialect.name == "postgresql":
+        return _search_postgres(db, q, limit, options)
+    film_index.catch_up(db)
+    ranked = film_index.search(q, limit)
+    if not ranked:
+        return []
+    films = {film.id: film for film in db.scalars(
+        select(models.Film).options(*options).where(models.Film.id.in_([id for id, _ in ranked])))}
+    return [films[id] for id, _ in ranked if id in films]
@@ -0,0 +1,83 @@
+import json
+import time
+from functools import lru_cache
+from typing import get_args, get_origin
+
+from decouple import config
+from pydantic import BaseModel, TypeAdapter
+
+from simplecrud.metrics import add_serialize_time
+
+try:
+    import orjson
+except ImportError:  # optional, pip install simplecrud[fast]
+    orjson = None
+
+# Build response bodies straight from ORM rows instead of validating them into the
+# response model first. Only for data that came out of our own database.
+FAST_SERIALIZATION = config("FAST_SERIALIZATION", default=False, cast=bool)
+
+
+def _is_model(annotation) -> bool:
+    return isinstance(annotation, type) and issubclass(annotation, BaseModel)
+
+
+@lru_cache(maxsize=None)
+def serializer(schema: type[BaseModel]):
+    """Compile `schema` once into a function that copies its fields off an ORM object.
+
+    Nested models and lists of models recurse; everything else is taken as is,
+    which is why this must only see rows we wrote (and validated) ourselves.
+    """
+    fields = []
+    for name, field in schema.model_fields.items():
+        annotation = field.annotation
+        if get_origin(annotation) is list and _is_model(get_args(annotation)[0]):
+            item = serializer(get_args(annotation)[0])
+            fields.append((name, lambda values, item=item: [item(v) for v in values]))
+        elif _is_model(annotation):
+            fields.append((name, serializer(annotation)))
+        else:
+            fields.append((name, None))
+
+    def serialize(obj) -> dict:
+        out = {}
+        for name, convert in fields:
+            value = getattr(obj, name)
+            out[name] = value if convert is None or value is None else convert(value)
+        return out
+
+    return serialize
+
+
+def dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+@lru_cache(maxsize=None)
+def _adapter(schema: type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(list[schema])
+
+
+def render(schema: type[BaseModel], obj) -> bytes:
+    start = time.perf_counter()
+    if FAST_SERIALIZATION:
+        body = dumps(serializer(schema)(obj))
+    else:
+        body = schema.model_validate(obj).model_dump_json(by_alias=False).encode()
+    add_serialize_time(time.perf_counter() - start)
+    return body
+
+
+def render_many(schema: type[BaseModel], objs: list) -> bytes:
+    start = time.perf_counter()
+    if FAST_SERIALIZATION:
+        serialize = serializer(schema)
+        body = dumps([serialize(obj) for obj in objs])
+    else:
+        adapter = _adapter(schema)
+        body = adapter.dump_json(adapter.validate_python(objs, from_attributes=True), by_alias=False)
+    add_serialize_time(time.perf_counter() - start)
+    return body
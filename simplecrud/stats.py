@@ -0,0 +1,125 @@
+"""Incremental upkeep of the summary tables in models.py (company_stats, release_year_stats, crew_role_stats).
+
+ORM writes are picked up by an after_flush hook, so every crud path that adds, changes
+or deletes films and crew links is covered inside its own transaction. Core inserts
+(bulk create, importer) report their rows through add_films/add_crew. rebuild()
+recomputes everything from scratch for when the tables have drifted.
+"""
+from sqlalchemy import delete, event, func, insert, select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+from . import models
+from .database import upsert_add
+
+FILM_FIELDS = ("company_id", "release_year", "budget")
+
+
+class Deltas:
+    def __init__(self):
+        self.companies = {}  # company id -> [films, budget]
+        self.years = {}  # release year -> [films, budget]
+        self.roles = {}  # crew role -> members
+
+    def film(self, company_id, release_year, budget, sign: int):
+        budget = (budget or 0) * sign
+        if company_id:
+            entry = self.companies.setdefault(company_id, [0, 0])
+            entry[0] += sign
+            entry[1] += budget
+        if release_year is not None:
+            entry = self.years.setdefault(release_year, [0, 0])
+            entry[0] += sign
+            entry[1] += budget
+
+    def crew(self, role, sign: int):
+        self.roles[role] = self.roles.get(role, 0) + sign
+
+    def apply(self, conn):
+        # Sorted keys, so concurrent writers lock the counter rows in the same order
+        dialect = conn.dialect.name
+        companies = [{"company_id": k, "film_count": n, "total_budget": b}
+                     for k, (n, b) in sorted(self.companies.items()) if n or b]
+        years = [{"release_year": k, "film_count": n, "total_budget": b}
+                 for k, (n, b) in sorted(self.years.items()) if n or b]
+        roles = [{"role": k, "member_count": n} for k, n in sorted(self.roles.items()) if n]
+        if companies:
+            conn.execute(upsert_add(models.company_stats, dialect, ["company_id"], ["film_count", "total_budget"]),
+                         companies)
+        if years:
+            conn.execute(upsert_add(models.release_year_stats, dialect, ["release_year"], ["film_count", "total_budget"]),
+                         years)
+        if roles:
+            conn.execute(upsert_add(models.crew_role_stats, dialect, ["role"], ["member_count"]), roles)
+
+
+def _old_value(obj, field):
+    # The value as of the last flush, before this one changed it
+    history = get_history(obj, field)
+    return history.deleted[0] if history.deleted else getattr(obj, field)
+
+
+def _film_values(film, old: bool) -> tuple:
+    return tuple(_old_value(film, field) if old else getattr(film, field) for field in FILM_FIELDS)
+
+
+@event.listens_for(Session, "after_flush")
+def track_stats(session, flush_context):
+    deltas = Deltas()
+    for obj in session.new:
+        if isinstance(obj, models.Film):
+            deltas.film(obj.company_id, obj.release_year, obj.budget, 1)
+        elif isinstance(obj, models.FilmCrewMembers):
+            deltas.crew(obj.role, 1)
+    for obj in session.deleted:
+        if isinstance(obj, models.Film):
+            deltas.film(*_film_values(obj, old=True), -1)
+        elif isinstance(obj, models.FilmCrewMembers):
+            deltas.crew(_old_value(obj, "role"), -1)
+    for obj in session.dirty:
+        if isinstance(obj, models.Film) and obj not in session.deleted:
+            old, new = _film_values(obj, old=True), _film_values(obj, old=False)
+            if old != new:
+                deltas.film(*old, -1)
+                deltas.film(*new, 1)
+        elif isinstance(obj, models.FilmCrewMembers) and obj not in session.deleted:
+            if _old_value(obj, "role") != obj.role:
+                deltas.crew(_old_value(obj, "role"), -1)
+                deltas.crew(obj.role, 1)
+    deltas.apply(session.connection())
+
+
+def add_films(conn, rows: list[dict]):
+    deltas = Deltas()
+    for row in rows:
+        deltas.film(row.get("company_id"), row["release_year"], row.get("budget"), 1)
+    deltas.apply(conn)
+
+
+def add_crew(conn, roles: list[str]):
+    deltas = Deltas()
+    for role in roles:
+        deltas.crew(role, 1)
+    deltas.apply(conn)
+
+
+def rebuild(conn):
+    if conn.dialect.name == "postgresql":
+        # Hold off writers so the recount and the hooks can't miss or double count a row
+        conn.execute(text("LOCK TABLE films, user_film IN SHARE MODE"))
+    film = models.Film
+    for table in (models.company_stats, models.release_year_stats, models.crew_role_stats):
+        conn.execute(delete(table))
+    conn.execute(insert(models.company_stats).from_select(
+        ["company_id", "film_count", "total_budget"],
+        select(film.company_id, func.count(), func.coalesce(func.sum(film.budget), 0))
+        .join(models.Company, models.Company.id == film.company_id).group_by(film.company_id),
+    ))
+    conn.execute(insert(models.release_year_stats).from_select(
+        ["release_year", "film_count", "total_budget"],
+        select(film.release_year, func.count(), func.coalesce(func.sum(film.budget), 0)).group_by(film.release_year),
+    ))
+    crew = models.FilmCrewMembers
+    conn.execute(insert(models.crew_role_stats).from_select(
+        ["role", "member_count"], select(crew.role, func.count()).group_by(crew.role),
+    ))
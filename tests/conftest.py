@@ -0,0 +1,72 @@
+import os
+import tempfile
+
+# simplecrud reads its settings when first imported, so point it at a scratch database first
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='simplecrud-tests-'), 'tests.db')}"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from simplecrud import coalesce, main, models, search
+from simplecrud.cache import response_cache
+from simplecrud.database import get_async_engine, get_engine
+
+
+@pytest.fixture(autouse=True)
+def schema():
+    # Fresh tables and per-process state for every test
+    engine = get_engine()
+    models.Base.metadata.drop_all(engine)
+    models.Base.metadata.create_all(engine)
+    response_cache.clear()
+    search.film_index.__init__()
+    coalesce.flights.__init__()
+    yield engine
+
+
+@pytest.fixture(params=["sync", "async"])
+def client(request):
+    # Every API test runs against both session flavours: threadpool + Session, and AsyncSession on aiosqlite
+    if request.param == "async":
+        main.app.dependency_overrides[main.get_sync_db] = main.get_async_db
+    try:
+        with TestClient(main.app) as client:
+            yield client
+    finally:
+        main.app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def statements():
+    # SQL sent to the database from here on, whichever engine the request went through
+    sent = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        sent.append(" ".join(statement.split()))
+
+    engines = [get_engine(), get_async_engine().sync_engine]
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    yield sent
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def writes(sent: list[str]) -> list[str]:
+    # "UPDATE films", "DELETE FROM user_film", ... for every statement that isn't a read
+    return [" ".join(statement.split()[:3 if statement.startswith(("INSERT", "DELETE")) else 2])
+            for statement in sent if not statement.startswith("SELECT")]
+
+
+def film_payload(title: str, **values) -> dict:
+    return {"title": title, "budget": 1000, "release_year": 2000, "genres": [], **values}
+
+
+def company_payload(name: str, **values) -> dict:
+    return {"name": name, "contact_email_address": "office@example.com", "phone_number": "5550100", **values}
+
+
+def user_payload(email: str, films=(), companies=(), **values) -> dict:
+    return {"first_name": "Ada", "last_name": "Lovelace", "email": email, "minimun_fee": 100,
+            "films": list(films), "companies": list(companies), **values}
@@ -0,0 +1,48 @@
+from simplecrud import crud
+from simplecrud.database import SessionLocal
+
+from .conftest import film_payload, user_payload
+
+
+def user_selects(sent: list[str]) -> list[str]:
+    return [statement for statement in sent if statement.startswith("SELECT users.")]
+
+
+def test_ids_in_the_order_asked_for(client):
+    ids = [client.post("/api/users/", json=user_payload(f"u{i}@example.com")).json()["id"] for i in range(3)]
+    response = client.get(f"/api/users/?ids={ids[2]},{ids[0]},999,{ids[2]}")
+    assert [user["id"] for user in response.json()] == [ids[2], ids[0]]
+    assert client.get("/api/users/?ids=1,x").status_code == 400
+
+
+def test_lookups_in_one_session_share_one_query(client, statements):
+    ids = [client.post("/api/users/", json=user_payload(f"u{i}@example.com")).json()["id"] for i in range(3)]
+    statements.clear()
+    with SessionLocal() as db:
+        crud.loader(db, crud.models.User, crud.USER_LOAD).prime(ids)
+        first, again = crud.get_user(db, ids[0]), crud.get_user(db, ids[0])
+        assert crud.get_user(db, ids[1]).id == ids[1]
+        # Misses are remembered too
+        assert crud.get_user(db, 999) is None and crud.get_user(db, 999) is None
+        assert [user.id for user in crud.get_users_by_ids(db, ids).items] == ids
+    assert first is again
+    # The primed ids and the miss: two IN queries, and nothing asked twice
+    assert len(user_selects(statements)) == 2
+
+
+def test_lookups_after_a_commit_read_again(client, statements):
+    user = client.post("/api/users/", json=user_payload("ada@example.com")).json()
+    with SessionLocal() as db:
+        crud.get_user(db, user["id"])
+        db.commit()
+        statements.clear()
+        crud.get_user(db, user["id"])
+    assert len(user_selects(statements)) == 1
+
+
+def test_full_update_reads_the_user_fresh_after_commit(client):
+    user = client.post("/api/users/", json=user_payload(
+        "ada@example.com", films=[{"role": "director", "film": film_payload("Engines")}])).json()
+    payload = {key: value for key, value in user.items() if key not in {"email", "version"}}
+    payload["films"] = []
+    assert client.post(f"/api/users/{user['id']}/", json=payload).json()["films"] == []
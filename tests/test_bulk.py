@@ -0,0 +1,55 @@
+from simplecrud import main
+
+from .conftest import company_payload, film_payload, user_payload
+
+
+def results(response) -> list[tuple]:
+    assert response.status_code == 200, response.text
+    return [(item["index"], item["id"] is not None, item["error"]) for item in response.json()["items"]]
+
+
+def test_users_report_one_result_per_item_in_order(client):
+    client.post("/api/users/", json=user_payload("taken@example.com"))
+    response = client.post("/api/users/bulk", json=[
+        user_payload("new@example.com"),
+        user_payload("TAKEN@example.com"),  # exists, whatever the case
+        {"first_name": "No", "email": "x@example.com"},  # invalid
+        user_payload("NEW@example.com"),  # repeats the first item
+        user_payload("other@example.com"),
+    ])
+    assert results(response) == [
+        (0, True, None),
+        (1, False, "User with email `TAKEN@example.com` already registered"),
+        (2, False, "last_name: Field required; minimun_fee: Field required"),
+        (3, False, "User with email `NEW@example.com` already registered"),
+        (4, True, None),
+    ]
+    assert (response.json()["created"], response.json()["failed"]) == (2, 3)
+    ids = [item["id"] for item in response.json()["items"] if item["id"]]
+    # Each id belongs to the item it is reported for
+    assert [client.get(f"/api/users/{id}/").json()["email"] for id in ids] == ["new@example.com", "other@example.com"]
+
+
+def test_films_check_their_company(client):
+    company = client.post("/api/companies/", json=company_payload("Analytical", films=[])).json()
+    client.post("/api/films/", json=film_payload("Taken"))
+    response = client.post("/api/films/bulk", json=[
+        film_payload("Taken"),
+        film_payload("Engines", company_id=company["id"], genres=["drama"]),
+        film_payload("Orphan", company_id=999),
+    ])
+    assert results(response) == [
+        (0, False, "Film with title `Taken` already registered"),
+        (1, True, None),
+        (2, False, "Company with company id (999) not found"),
+    ]
+    film = client.get(f"/api/films/{response.json()['items'][1]['id']}/").json()
+    assert (film["title"], film["company_id"], film["genres"]) == ("Engines", company["id"], ["drama"])
+
+
+def test_companies_and_the_size_limit(client, monkeypatch):
+    response = client.post("/api/companies/bulk", json=[company_payload("One"), company_payload("One")])
+    assert results(response) == [(0, True, None), (1, False, "Company with name `One` already exist, try editing")]
+
+    monkeypatch.setattr(main, "BULK_MAX_ITEMS", 1)
+    assert client.post("/api/companies/bulk", json=[company_payload("A"), company_payload("B")]).status_code == 413
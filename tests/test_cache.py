@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import insert
+
+from simplecrud import models
+from simplecrud.cache import response_cache
+
+from .conftest import company_payload, film_payload, user_payload
+
+
+@pytest.fixture(autouse=True)
+def cache_on(monkeypatch):
+    monkeypatch.setattr(response_cache, "enabled", True)
+
+
+def test_detail_is_served_from_cache_with_etag(client):
+    user = client.post("/api/users/", json=user_payload("ada@example.com")).json()
+    first = client.get(f"/api/users/{user['id']}/")
+    assert client.get(f"/api/users/{user['id']}/").content == first.content
+    assert response_cache.stats()["hits"] >= 1
+    assert client.get(f"/api/users/{user['id']}/", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+
+def test_shared_film_and_company_edits_reach_other_users(client, schema):
+    ada = client.post("/api/users/", json=user_payload(
+        "ada@example.com", films=[{"role": "director", "film": film_payload("Engines")}],
+        companies=[{"role": "owner", "company": company_payload("Analytical")}])).json()
+    charles = client.post("/api/users/", json=user_payload("charles@example.com")).json()
+    with schema.begin() as conn:
+        conn.execute(insert(models.FilmCrewMembers).values(
+            user_id=charles["id"], film_id=ada["films"][0]["film"]["id"], role="writer"))
+        conn.execute(insert(models.CompanyStaff).values(
+            user_id=charles["id"], company_id=ada["companies"][0]["company"]["id"], role="member"))
+    response_cache.clear()
+    cached = client.get(f"/api/users/{charles['id']}/").json()
+    assert cached["films"][0]["film"]["title"] == "Engines"
+
+    payload = {key: value for key, value in ada.items() if key not in {"email", "version"}}
+    payload["films"][0]["film"]["title"] = "Difference"
+    payload["companies"][0]["company"]["name"] = "Babbage & Co"
+    assert client.post(f"/api/users/{ada['id']}/", json=payload).status_code == 200
+
+    fresh = client.get(f"/api/users/{charles['id']}/").json()
+    assert fresh["films"][0]["film"]["title"] == "Difference"
+    assert fresh["companies"][0]["company"]["name"] == "Babbage & Co"
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from simplecrud.cache import response_cache
+from simplecrud.coalesce import Flights
+
+from .conftest import user_payload
+
+
+class Work:
+    """A fetch that blocks until released, counting how often it ran."""
+
+    def __init__(self):
+        self.runs = 0
+        self.release = None
+
+    async def __call__(self):
+        self.runs += 1
+        run, self.release = self.runs, asyncio.Event()
+        await self.release.wait()
+        return f"body {run}"
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_identical_requests_share_one_run():
+    async def scenario():
+        flights, work = Flights(), Work()
+        tasks = [asyncio.create_task(flights.run(("/api/films/", ""), work)) for _ in range(3)]
+        await settle()
+        work.release.set()
+        return flights, work, await asyncio.gather(*tasks)
+
+    flights, work, bodies = asyncio.run(scenario())
+    assert bodies == ["body 1"] * 3 and work.runs == 1
+    stats = flights.stats()
+    assert (stats["leaders"], stats["followers"], stats["in_flight"]) == (1, 2, 0)
+    assert stats["hot_keys"] == [{"key": "/api/films/", "peak_concurrency": 3, "coalesced": 2}]
+
+
+def test_errors_reach_every_waiter():
+    async def scenario():
+        flights, started = Flights(), asyncio.Event()
+
+        async def failing():
+            started.set()
+            await asyncio.sleep(0.01)
+            raise LookupError("gone")
+
+        tasks = [asyncio.create_task(flights.run(("/api/users/1/", ""), failing)) for _ in range(2)]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert [type(result) for result in asyncio.run(scenario())] == [LookupError, LookupError]
+
+
+def test_a_follower_takes_over_when_the_leader_is_cancelled():
+    async def scenario():
+        flights, work = Flights(), Work()
+        leader = asyncio.create_task(flights.run(("/api/users/", ""), work))
+        await settle()
+        follower = asyncio.create_task(flights.run(("/api/users/", ""), work))
+        await settle()
+        leader.cancel()
+        await settle()
+        work.release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return work, await follower
+
+    work, body = asyncio.run(scenario())
+    assert body == "body 2" and work.runs == 2
+
+
+def test_requests_after_a_write_do_not_join_an_earlier_flight():
+    async def scenario():
+        flights, work = Flights(), Work()
+        before = asyncio.create_task(flights.run(("/api/users/", ""), work))
+        await settle()
+        first = work.release
+        response_cache.invalidate(set())
+        after = asyncio.create_task(flights.run(("/api/users/", ""), work))
+        await settle()
+        first.set()
+        work.release.set()
+        return work, await before, await after
+
+    work, before, after = asyncio.run(scenario())
+    assert (before, after, work.runs) == ("body 1", "body 2", 2)
+
+
+@pytest.mark.parametrize("path, items", [
+    ("/api/users/bulk", [user_payload("bulk@example.com")]),
+    ("/api/companies/bulk", [{"name": "Bulk", "contact_email_address": "b@example.com", "phone_number": "1"}]),
+])
+def test_bulk_creates_move_the_epoch(client, path, items):
+    epoch = response_cache.epoch()
+    assert client.post(path, json=items).json()["created"] == 1
+    assert response_cache.epoch() > epoch
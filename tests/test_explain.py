@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import create_engine
+
+from benchmarks import explain
+from benchmarks.datagen import DatasetSpec, generate
+from simplecrud import crud
+
+from .conftest import film_payload
+
+
+@pytest.fixture(scope="module")
+def seeded(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('explain') / 'explain.db'}")
+    generate(engine, DatasetSpec(films=2000))
+    with engine.connect() as conn:
+        explain.prepare(conn)
+        yield conn
+    engine.dispose()
+
+
+def test_every_supported_combination_is_an_index_scan(seeded):
+    failures = explain.check(seeded)
+    assert not failures, "\n".join(f"sort={sort} after={bool(after)} {filters}: {' | '.join(lines)}"
+                                   for filters, sort, after, lines in failures)
+
+
+def test_combinations_cover_every_filter_and_sort():
+    seen = {(frozenset(filters), sort) for filters, sort, _ in explain.combinations()}
+    assert (frozenset({"company_id"}), "-title") in seen
+    assert (frozenset({"budget_min", "budget_max"}), "budget") in seen
+    assert {sort.removeprefix("-") for filters, sort in seen if not filters} == set(crud.FILM_SORTS)
+
+
+@pytest.mark.parametrize("query", [
+    "release_year_min=1990&sort=id",
+    "budget_max=100&sort=release_year",
+    "genre=drama&sort=title",
+])
+def test_unindexed_sort_and_filter_is_rejected(client, query):
+    response = client.get(f"/api/films/?{query}")
+    assert response.status_code == 400
+    assert "can't be combined" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("query, column", [
+    ("release_year_min=1990", "release_year"),
+    ("budget_min=1", "budget"),
+    ("release_year_max=2020&budget_max=25", "budget"),
+])
+def test_range_filter_without_sort_pages_by_its_column(client, query, column):
+    for title, year, budget in (("Gamma", 2001, 30), ("Alpha", 2010, 10), ("Beta", 1995, 20), ("Old", 1980, 5)):
+        client.post("/api/films/", json=film_payload(title, release_year=year, budget=budget))
+    response = client.get(f"/api/films/?{query}&limit=2")
+    assert response.status_code == 200
+    values = [film[column] for film in response.json()]
+    assert values == sorted(values) and len(values) == 2
+    cursor = response.headers["X-Next-Cursor"]
+    rest = client.get(f"/api/films/?{query}&limit=2&after={cursor}").json()
+    assert all(film[column] >= values[-1] for film in rest)
+
+
+def test_company_films_in_title_order(client):
+    company = client.post("/api/companies/", json={"name": "Acme", "contact_email_address": "a@example.com",
+                                                    "phone_number": "1", "films": []}).json()
+    for title in ("Gamma", "Alpha", "Beta"):
+        client.post("/api/films/", json=film_payload(title, company_id=company["id"]))
+    client.post("/api/films/", json=film_payload("Aardvark"))
+    response = client.get(f"/api/films/?company_id={company['id']}&sort=title")
+    assert [film["title"] for film in response.json()] == ["Alpha", "Beta", "Gamma"]
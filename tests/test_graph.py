@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import insert
+
+from simplecrud import models
+
+
+@pytest.fixture
+def people(schema):
+    # ada -Engines- bea -Analytical- cal -Notes- dan -Difference- eve, and fay on her own
+    names = ["ada", "bea", "cal", "dan", "eve", "fay"]
+    with schema.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"id": i, "first_name": name.title(), "last_name": "X", "email": f"{name}@example.com", "minimun_fee": 1}
+            for i, name in enumerate(names, 1)])
+        conn.execute(insert(models.Film), [{"id": 1, "title": "Engines", "release_year": 1990, "budget": 1},
+                                           {"id": 2, "title": "Notes", "release_year": 1991, "budget": 1}])
+        conn.execute(insert(models.Company), [
+            {"id": 1, "name": "Analytical", "contact_email_address": "a@example.com", "phone_number": "1"},
+            {"id": 2, "name": "Difference", "contact_email_address": "d@example.com", "phone_number": "2"}])
+        conn.execute(insert(models.FilmCrewMembers), [{"user_id": 1, "film_id": 1, "role": "director"},
+                                                      {"user_id": 2, "film_id": 1, "role": "director"},
+                                                      {"user_id": 3, "film_id": 2, "role": "writer"},
+                                                      {"user_id": 4, "film_id": 2, "role": "writer"}])
+        conn.execute(insert(models.CompanyStaff), [{"user_id": 2, "company_id": 1, "role": "member"},
+                                                   {"user_id": 3, "company_id": 1, "role": "member"},
+                                                   {"user_id": 4, "company_id": 2, "role": "owner"},
+                                                   {"user_id": 5, "company_id": 2, "role": "owner"}])
+    return {name: i for i, name in enumerate(names, 1)}
+
+
+def steps(response) -> list[tuple]:
+    assert response.status_code == 200, response.text
+    return [(step["first_name"], step["via"], step["via_name"]) for step in response.json()]
+
+
+def test_shortest_path_over_films_and_companies(client, people):
+    assert steps(client.get(f"/api/users/{people['ada']}/path/{people['eve']}")) == [
+        ("Ada", None, None), ("Bea", "film", "Engines"), ("Cal", "company", "Analytical"),
+        ("Dan", "film", "Notes"), ("Eve", "company", "Difference")]
+    # The same chain walked from the other end: each link moves onto the user it leads to
+    assert steps(client.get(f"/api/users/{people['eve']}/path/{people['ada']}")) == [
+        ("Eve", None, None), ("Dan", "company", "Difference"), ("Cal", "film", "Notes"),
+        ("Bea", "company", "Analytical"), ("Ada", "film", "Engines")]
+    assert steps(client.get(f"/api/users/{people['cal']}/path/{people['cal']}")) == [("Cal", None, None)]
+
+
+def test_path_respects_the_depth_limit(client, people):
+    response = client.get(f"/api/users/{people['ada']}/path/{people['eve']}?max_depth=3")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "No collaboration path within 3 hops"
+    assert len(steps(client.get(f"/api/users/{people['ada']}/path/{people['eve']}?max_depth=4"))) == 5
+    assert client.get(f"/api/users/{people['ada']}/path/{people['eve']}?max_depth=99").status_code == 400
+
+
+def test_path_only_uses_the_links_asked_for(client, people):
+    for query in ("via=film", "role=director&role=member&role=writer"):
+        assert client.get(f"/api/users/{people['ada']}/path/{people['eve']}?{query}").status_code == 404
+    assert len(steps(client.get(f"/api/users/{people['ada']}/path/{people['dan']}"
+                                "?role=director&role=member&role=writer"))) == 4
+
+
+def test_unknown_and_unconnected_users_are_404(client, people):
+    response = client.get(f"/api/users/{people['ada']}/path/{people['fay']}")
+    assert response.status_code == 404 and response.json()["detail"].startswith("No collaboration path")
+    response = client.get(f"/api/users/{people['ada']}/path/999")
+    assert response.status_code == 404 and "not found" in response.json()["detail"]
+    assert client.get("/api/users/999/collaborators").status_code == 404
+
+
+def test_collaborators_by_distance(client, people):
+    def found(query):
+        response = client.get(f"/api/users/{people['ada']}/collaborators?{query}")
+        assert response.status_code == 200, response.text
+        return [(user["first_name"], user["distance"]) for user in response.json()]
+
+    assert found("depth=3") == [("Bea", 1), ("Cal", 2), ("Dan", 3)]
+    assert found("depth=3&limit=2") == [("Bea", 1), ("Cal", 2)]
+    assert found("depth=3&via=film") == [("Bea", 1)]
+    assert found("depth=3&role=director") == [("Bea", 1)]
+    assert client.get(f"/api/users/{people['fay']}/collaborators").json() == []
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from simplecrud import importer
+
+
+def write_ndjson(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+    return str(path)
+
+
+def test_links_match_user_emails_case_insensitively(client, tmp_path):
+    importer.import_file("users", write_ndjson(tmp_path / "users.ndjson", [
+        {"first_name": "Ada", "last_name": "Lovelace", "email": "Ada@example.com", "minimun_fee": 100}]), out=str)
+    importer.import_file("films", write_ndjson(tmp_path / "films.ndjson", [
+        {"title": "Engines", "budget": 1000, "release_year": 1990}]), out=str)
+    links = write_ndjson(tmp_path / "user_film.ndjson", [
+        {"role": "director", "user_email": "ada@example.com", "film_title": "Engines"}])
+    assert importer.import_file("user_film", links, out=str)["inserted"] == 1
+    (user,) = client.get("/api/users/").json()
+    assert [link["film"]["title"] for link in user["films"]] == ["Engines"]
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_an_interrupted_import_resumes_after_its_last_batch(client, tmp_path):
+    records = [{"first_name": "U", "last_name": str(i), "email": f"u{i}@example.com", "minimun_fee": 1}
+               for i in range(5)]
+    records[3]["minimun_fee"] = -1  # rejected by validation
+    path = write_ndjson(tmp_path / "users.ndjson", records)
+
+    def stop_after_first_batch(message):
+        raise Interrupted(message)
+
+    with pytest.raises(Interrupted):
+        importer.import_file("users", path, batch_size=2, out=stop_after_first_batch)
+    assert json.loads((tmp_path / "users.ndjson.users.checkpoint").read_text()) == {"line": 2}
+    assert len(client.get("/api/users/").json()) == 2
+
+    messages = []
+    result = importer.import_file("users", path, batch_size=2, out=messages.append)
+    assert messages[0] == f"Resuming {path} after line 2"
+    assert result == {"read": 5, "inserted": 2, "existing": 0, "rejected": 1}
+    assert not (tmp_path / "users.ndjson.users.checkpoint").exists()
+    rejects = [json.loads(line) for line in (tmp_path / "users.ndjson.rejects.ndjson").read_text().splitlines()]
+    assert [reject["line"] for reject in rejects] == [4]
+    assert len(client.get("/api/users/").json()) == 4
+
+    # Starting over finds everything already there
+    again = importer.import_file("users", path, batch_size=2, restart=True, out=str)
+    assert again == {"read": 5, "inserted": 0, "existing": 4, "rejected": 1}
+
+
+def test_csv_films_with_genres_and_companies(client, tmp_path):
+    client.post("/api/companies/", json={"name": "Analytical", "contact_email_address": "a@example.com",
+                                         "phone_number": "1", "films": []})
+    path = tmp_path / "films.csv"
+    path.write_text("title,budget,release_year,genres,company_name,description\n"
+                    "Engines,10,1990,drama|history,Analytical,\n"
+                    "Notes,5,1991,,,Short\n"
+                    "Orphan,5,1991,,Nobody,\n")
+    result = importer.import_file("films", str(path), out=str)
+    assert result == {"read": 3, "inserted": 2, "existing": 0, "rejected": 1}
+    films = {film["title"]: film for film in client.get("/api/films/").json()}
+    assert films["Engines"]["genres"] == ["drama", "history"] and films["Engines"]["company_id"]
+    assert films["Notes"]["description"] == "Short" and films["Notes"]["company_id"] is None
@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import insert
+
+from simplecrud import models
+
+# Ties on last_name make the id tiebreak part of every cursor comparison
+LAST_NAMES = ["Hopper", "Byron", "Hopper", "Turing", "Byron", "Hopper", "Lovelace"]
+
+
+@pytest.fixture
+def users(schema):
+    with schema.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"id": i, "first_name": "U", "last_name": name, "email": f"u{i}@example.com", "minimun_fee": 1}
+            for i, name in enumerate(LAST_NAMES, 1)])
+    return [(name, i) for i, name in enumerate(LAST_NAMES, 1)]
+
+
+def walk(client, query: str) -> list[list[int]]:
+    # Follows X-Next-Cursor to the end; returns the ids per page
+    pages, cursor = [], None
+    while True:
+        response = client.get(f"/api/users/?{query}" + (f"&after={cursor}" if cursor else ""))
+        assert response.status_code == 200, response.text
+        pages.append([user["id"] for user in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("sort, reverse", [("id", False), ("-id", True), ("last_name", False),
+                                           ("-last_name", True)])
+def test_cursor_pages_cover_every_row_once_in_order(client, users, sort, reverse):
+    pages = walk(client, f"sort={sort}&limit=3")
+    key = (lambda user: user[1]) if sort.endswith("id") else (lambda user: user)
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sum(pages, []) == [id for _, id in sorted(users, key=key, reverse=reverse)]
+
+
+def test_no_cursor_when_the_last_page_is_exactly_full(client, users):
+    response = client.get(f"/api/users/?limit={len(users)}")
+    assert len(response.json()) == len(users)
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_cursor_only_works_with_the_sort_it_came_from(client, users):
+    cursor = client.get("/api/users/?sort=last_name&limit=2").headers["X-Next-Cursor"]
+    response = client.get(f"/api/users/?sort=-last_name&after={cursor}")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cursor was issued for sort `last_name`, not `-last_name`"
+    assert client.get("/api/users/?after=not-a-cursor").status_code == 400
+
+
+def test_skip_is_ignored_once_a_cursor_is_given(client, users):
+    assert [user["id"] for user in client.get("/api/users/?skip=2&limit=2").json()] == [3, 4]
+    cursor = client.get("/api/users/?limit=2").headers["X-Next-Cursor"]
+    assert [user["id"] for user in client.get(f"/api/users/?skip=4&limit=2&after={cursor}").json()] == [3, 4]
+
+
+@pytest.mark.parametrize("query", ["limit=0", "sort=email"])
+def test_bad_paging_parameters_are_400(client, users, query):
+    assert client.get(f"/api/users/?{query}").status_code == 400
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+from simplecrud import database, main, models
+from simplecrud.cache import response_cache
+
+from .conftest import user_payload
+
+
+def use_replicas(monkeypatch, urls: list[str]) -> database.ReplicaSet:
+    replicas = database.ReplicaSet(urls, interval=60)
+    monkeypatch.setattr(database, "replicas", replicas)
+    return replicas
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    # A second SQLite file standing in for a replica that hasn't received anything yet
+    url = f"sqlite:///{tmp_path / 'replica.db'}"
+    engine = create_engine(url)
+    models.Base.metadata.create_all(engine)
+    use_replicas(monkeypatch, [url])
+    yield engine
+    engine.dispose()
+    for key in ("replica0", "replica0-async"):
+        built = database._engines.pop(key, None)
+        if built is not None and built is not getattr(built, "sync_engine", built):
+            asyncio.run(built.dispose())
+        elif built is not None:
+            built.dispose()
+
+
+def test_reads_go_to_the_replica(replica, client):
+    user = client.post("/api/users/", json=user_payload("ada@example.com")).json()
+    reader = TestClient(main.app)
+    # Written to the primary only, so a reader sent to the (empty) replica doesn't see it
+    assert reader.get(f"/api/users/{user['id']}/").status_code == 404
+    assert reader.get("/api/users/").json() == []
+
+
+def test_writer_reads_its_own_writes_from_the_primary(replica, client):
+    response = client.post("/api/users/", json=user_payload("ada@example.com"))
+    assert f"Max-Age={database.DB_STICKY_SECONDS}" in response.headers["set-cookie"]
+    assert main.STICKY_COOKIE in client.cookies
+    assert client.get(f"/api/users/{response.json()['id']}/").status_code == 200
+
+
+def test_down_replica_falls_back_to_the_primary(tmp_path, monkeypatch, client):
+    replicas = use_replicas(monkeypatch, [f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"])
+    replicas.check()
+    assert replicas.pick() is None and not replicas.stats()[0]["healthy"]
+    user = client.post("/api/users/", json=user_payload("ada@example.com")).json()
+    assert TestClient(main.app).get(f"/api/users/{user['id']}/").status_code == 200
+
+
+def test_lagging_replica_never_feeds_the_cache(replica, client, monkeypatch):
+    monkeypatch.setattr(response_cache, "enabled", True)
+    user = client.post("/api/users/", json=user_payload("ada@example.com")).json()
+    # The replica has the user as it was before the write below
+    with replica.begin() as conn:
+        conn.execute(models.User.__table__.insert().values(
+            id=user["id"], first_name="Ada", last_name="Lovelace", email="ada@example.com", minimun_fee=100))
+    assert client.patch(f"/api/users/{user['id']}/", json={"first_name": "Augusta"}).status_code == 200
+
+    reader = TestClient(main.app)
+    assert reader.get(f"/api/users/{user['id']}/").json()["first_name"] == "Ada"
+    assert response_cache.stats()["entries"] == 0
+    # The writer bypasses the cache and keeps seeing its write; the reader gets whatever the
+    # replica has until it catches up, never a copy cached from it
+    assert client.get(f"/api/users/{user['id']}/").json()["first_name"] == "Augusta"
+    assert reader.get(f"/api/users/{user['id']}/").json()["first_name"] == "Ada"
+    assert response_cache.stats()["entries"] == 0
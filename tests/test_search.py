@@ -0,0 +1,94 @@
+import time
+
+from sqlalchemy import insert, update
+
+from simplecrud import models, search
+from simplecrud.database import SessionLocal
+
+from .conftest import film_payload, user_payload
+
+
+def titles(client, q: str) -> list[str]:
+    response = client.get("/api/films/search", params={"q": q})
+    assert response.status_code == 200, response.text
+    return [film["title"] for film in response.json()]
+
+
+def test_renamed_film_is_found_by_its_new_title_only(client):
+    user = client.post("/api/users/", json=user_payload(
+        "ada@example.com", films=[{"role": "director", "film": film_payload("Alpha")}])).json()
+    assert titles(client, "alpha") == ["Alpha"]
+
+    payload = {key: value for key, value in user.items() if key not in {"email", "version"}}
+    payload["films"][0]["film"]["title"] = "Zebra"
+    assert client.post(f"/api/users/{user['id']}/", json=payload).status_code == 200
+    assert titles(client, "zebra") == ["Zebra"]
+    assert titles(client, "alpha") == []
+
+
+def test_new_films_are_searchable_straight_away(client):
+    titles(client, "anything")  # builds the index
+    client.post("/api/films/", json=film_payload("Gamma Rays"))
+    client.post("/api/films/bulk", json=[film_payload("Delta Waves")])
+    assert titles(client, "gamma") == ["Gamma Rays"]
+    assert titles(client, "waves") == ["Delta Waves"]
+
+
+def test_resync_picks_up_edits_and_late_commits_from_elsewhere(client, schema):
+    client.post("/api/films/", json=film_payload("Alpha"))
+    client.post("/api/films/", json=film_payload("Beta"))
+    assert titles(client, "alpha") == ["Alpha"]
+    # Another worker renames a film and a lower id commits after this index has moved past it
+    with schema.begin() as conn:
+        conn.execute(update(models.Film).where(models.Film.title == "Alpha").values(title="Omega"))
+        conn.execute(insert(models.Film).values(id=100, title="Late", release_year=2000, budget=1))
+    search.film_index.max_id = 1000
+    assert titles(client, "late") == []
+
+    # What the background thread does every SEARCH_RESYNC_SECONDS; searches never resync themselves
+    with SessionLocal() as db:
+        search.film_index.resync(db)
+    assert titles(client, "late") == ["Late"]
+    assert titles(client, "omega") == ["Omega"]
+    assert titles(client, "alpha") == []
+
+
+def test_resync_runs_in_the_background(client, schema):
+    client.post("/api/films/", json=film_payload("Alpha"))
+    assert titles(client, "alpha") == ["Alpha"]
+    with schema.begin() as conn:
+        conn.execute(update(models.Film).values(title="Omega"))
+    index = search.film_index
+    index.resync_seconds = 0.01
+    index.start(SessionLocal)
+    try:
+        deadline = time.monotonic() + 5
+        while "omega" not in index.postings and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        index.stop()
+    assert titles(client, "omega") == ["Omega"]
+
+
+def test_resync_keeps_films_indexed_while_it_scans(client, monkeypatch):
+    for title in ("Alpha", "Beta", "Gamma"):
+        client.post("/api/films/", json=film_payload(title))
+    index = search.film_index
+    titles(client, "alpha")
+    scan = index._scan
+
+    def racing_scan(db, after, batch_size):
+        for row in scan(db, after, batch_size):
+            if row.id == 2:
+                # Committed after the scan passed its id, so only this worker's commit hook indexes it
+                index.add(2, "Beta Prime", None)
+                continue
+            yield row
+        # And one that committed after the scan read its last row
+        index.add(500, "Newest", None)
+
+    monkeypatch.setattr(index, "_scan", racing_scan)
+    with SessionLocal() as db:
+        index.resync(db)
+    assert {2, 500} <= index.documents.keys()
+    assert titles(client, "prime") == ["Beta"]  # the row itself still says Beta
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+from sqlalchemy import select
+
+from simplecrud import importer, models, stats
+
+from .conftest import company_payload, film_payload, user_payload
+
+TABLES = (models.company_stats, models.release_year_stats, models.crew_role_stats)
+
+
+def summary(conn) -> list[set]:
+    # Rows per summary table, leaving out groups that counted down to nothing (rebuild has none)
+    return [{tuple(row) for row in conn.execute(select(table)) if any(row[1:])} for table in TABLES]
+
+
+def assert_matches_rebuild(engine):
+    with engine.connect() as conn:
+        kept = summary(conn)
+        stats.rebuild(conn)
+        assert kept == summary(conn)
+        conn.rollback()
+
+
+@pytest.fixture
+def companies(client):
+    return [client.post("/api/companies/", json=company_payload(name, films=[])).json()["id"]
+            for name in ("Analytical", "Difference")]
+
+
+def test_orm_writes_keep_the_counters_exact(client, schema, companies):
+    first, second = companies
+    user = client.post("/api/users/", json=user_payload(
+        "ada@example.com",
+        films=[{"role": "director", "film": film_payload("Engines", company_id=first, budget=100, release_year=1990)},
+               {"role": "writer", "film": film_payload("Notes", company_id=first, budget=50, release_year=1991)}],
+        companies=[{"role": "owner", "company": company_payload("Babbage & Co")}])).json()
+    client.post("/api/films/", json=film_payload("Solo", company_id=second, budget=7, release_year=1990))
+    assert_matches_rebuild(schema)
+    assert {(row["release_year"], row["film_count"], row["total_budget"])
+            for row in client.get("/api/films/stats").json()} == {(1990, 2, 107), (1991, 1, 50)}
+
+    # Moves a film to another year and company, changes a role and drops the other link
+    payload = {key: value for key, value in user.items() if key not in {"email", "version"}}
+    engines = payload["films"][0]
+    engines["role"] = "producer"
+    engines["film"].update(release_year=1995, company_id=second, budget=120)
+    payload["films"] = [engines]
+    assert client.post(f"/api/users/{user['id']}/", json=payload).status_code == 200
+    assert_matches_rebuild(schema)
+    assert {row["role"]: row["member_count"] for row in client.get("/api/crew/stats").json()} == {"producer": 1}
+    assert client.get(f"/api/companies/{second}/stats").json() == {
+        "company_id": second, "film_count": 2, "total_budget": 127}
+
+
+def test_core_writes_keep_the_counters_exact(client, schema, companies, tmp_path):
+    result = client.post("/api/films/bulk", json=[
+        film_payload("Bulk One", company_id=companies[0], budget=10, release_year=2001),
+        film_payload("Bulk Two", budget=20, release_year=2001),
+        film_payload("Bulk One", budget=99, release_year=2002),  # duplicate, not counted
+    ]).json()
+    assert result["created"] == 2
+    assert_matches_rebuild(schema)
+
+    client.post("/api/users/", json=user_payload("ada@example.com"))
+    for kind, records in (
+        ("films", [{"title": "Imported", "budget": 5, "release_year": 2001, "company_name": "Difference"},
+                   {"title": "Bulk Two", "budget": 5, "release_year": 2003}]),  # already there
+        ("user_film", [{"role": "writer", "user_email": "ada@example.com", "film_title": "Imported"},
+                       {"role": "director", "user_email": "ada@example.com", "film_title": "Bulk One"}]),
+    ):
+        path = tmp_path / f"{kind}.ndjson"
+        path.write_text("".join(json.dumps(record) + "\n" for record in records))
+        importer.import_file(kind, str(path), out=str)
+    assert_matches_rebuild(schema)
+    assert {(row["release_year"], row["film_count"], row["total_budget"])
+            for row in client.get("/api/films/stats").json()} == {(2001, 3, 35)}
+    assert {row["role"]: row["member_count"] for row in client.get("/api/crew/stats").json()} == {
+        "director": 1, "writer": 1}
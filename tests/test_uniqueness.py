@@ -0,0 +1,41 @@
+import pytest
+
+from .conftest import company_payload, film_payload, user_payload
+
+
+@pytest.fixture
+def user(client):
+    client.post("/api/films/", json=film_payload("Taken"))
+    client.post("/api/companies/", json=company_payload("Taken Co", films=[]))
+    return client.post("/api/users/", json=user_payload(
+        "ada@example.com", films=[{"role": "director", "film": film_payload("Engines")}],
+        companies=[{"role": "owner", "company": company_payload("Analytical")}])).json()
+
+
+def test_duplicate_creates_are_rejected(client, user):
+    assert client.post("/api/films/", json=film_payload("Taken")).json()["detail"] == \
+        "Film with title `Taken` already registered"
+    assert client.post("/api/users/", json=user_payload("ADA@example.com")).status_code == 400
+    # Only the nested film that clashes is named
+    response = client.post("/api/companies/", json=company_payload("Fresh", films=[film_payload("New", id=0),
+                                                                                   film_payload("Taken", id=0)]))
+    assert response.json()["detail"] == "Film with title `Taken` already registered"
+
+
+@pytest.mark.parametrize("edit, detail", [
+    (lambda u: u["films"][0]["film"].update(title="Taken"), "Film with title `Taken` already registered"),
+    (lambda u: u["films"].append({"role": "writer", "film": film_payload("Taken")}),
+     "Film with title `Taken` already registered"),
+    (lambda u: u["films"].extend({"role": role, "film": film_payload("Twice")} for role in ("writer", "producer")),
+     "Film with title `Twice` already registered"),
+    (lambda u: u["companies"][0]["company"].update(name="Taken Co"),
+     "Company with name `Taken Co` already exist, try editing"),
+])
+def test_full_update_onto_a_taken_name_is_409(client, user, edit, detail):
+    payload = {key: value for key, value in user.items() if key not in {"email", "version"}}
+    edit(payload)
+    response = client.post(f"/api/users/{user['id']}/", json=payload)
+    assert response.status_code == 409
+    assert response.json()["detail"] == detail
+    # Nothing of the update was kept
+    assert [link["film"]["title"] for link in client.get(f"/api/users/{user['id']}/").json()["films"]] == ["Engines"]
@@ -0,0 +1,49 @@
+import pytest
+
+from .conftest import user_payload
+
+
+@pytest.fixture
+def user(client):
+    response = client.post("/api/users/", json=user_payload("ada@example.com"))
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def test_patch_is_one_statement(client, user, statements):
+    response = client.patch(f"/api/users/{user['id']}/", json={"first_name": "Augusta"})
+    assert response.status_code == 200, response.text
+    assert response.json()["first_name"] == "Augusta"
+    assert response.json()["version"] == user["version"] + 1
+    assert len(statements) == 1 and statements[0].startswith("UPDATE users")
+
+
+def test_detail_etag_is_accepted_as_if_match(client, user):
+    etag = client.get(f"/api/users/{user['id']}/").headers["ETag"]
+    response = client.patch(f"/api/users/{user['id']}/", json={"last_name": "King"}, headers={"If-Match": etag})
+    assert response.status_code == 200, response.text
+    assert client.get(f"/api/users/{user['id']}/").headers["ETag"] != etag
+
+
+def test_stale_if_match_is_412_and_writes_nothing(client, user):
+    etag = client.get(f"/api/users/{user['id']}/").headers["ETag"]
+    assert client.patch(f"/api/users/{user['id']}/", json={"last_name": "King"}).status_code == 200
+
+    response = client.patch(f"/api/users/{user['id']}/", json={"last_name": "Byron"}, headers={"If-Match": etag})
+    assert response.status_code == 412
+    assert response.json()["detail"] == f"User is at version {user['version'] + 1}, not {user['version']}"
+    assert client.get(f"/api/users/{user['id']}/").json()["last_name"] == "King"
+
+
+@pytest.mark.parametrize("if_match, status", [
+    ("1", 200), ('"1"', 200), ('"v1"', 200), ("*", 200), ("2", 412), ('"not-a-version"', 412),
+    # If-Match compares strongly, so a weak tag never matches even at the right version
+    ('W/"v1"', 412), ('W/"1"', 412),
+])
+def test_if_match_forms(client, user, if_match, status):
+    response = client.patch(f"/api/users/{user['id']}/", json={"minimun_fee": 5}, headers={"If-Match": if_match})
+    assert response.status_code == status, response.text
+
+
+def test_patch_unknown_user(client):
+    assert client.patch("/api/users/404/", json={"first_name": "Nobody"}, headers={"If-Match": "1"}).status_code == 400
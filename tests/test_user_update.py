@@ -0,0 +1,75 @@
+import pytest
+
+from .conftest import company_payload, film_payload, user_payload, writes
+
+
+@pytest.fixture
+def user(client):
+    response = client.post("/api/users/", json=user_payload(
+        "ada@example.com",
+        films=[{"role": "director", "film": film_payload("Engines", genres=["drama", "action"])},
+               {"role": "writer", "film": film_payload("Notes")}],
+        companies=[{"role": "owner", "company": company_payload("Analytical")}]))
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def as_update(user: dict) -> dict:
+    # The detail response turned back into a full update payload
+    return {key: value for key, value in user.items() if key not in {"email", "version"}}
+
+
+def update(client, user: dict):
+    return client.post(f"/api/users/{user['id']}/", json=as_update(user))
+
+
+def test_unchanged_payload_writes_nothing(client, user, statements):
+    response = update(client, user)
+    assert response.status_code == 200, response.text
+    assert writes(statements) == []
+
+
+def test_genres_in_another_order_are_unchanged(client, user, statements):
+    user["films"][0]["film"]["genres"] = ["drama", "action"]
+    assert update(client, user).status_code == 200
+    assert writes(statements) == []
+
+
+def test_only_the_changed_row_is_updated(client, user, statements):
+    user["films"][1]["film"]["title"] = "Sketches"
+    response = update(client, user)
+    assert response.status_code == 200, response.text
+    assert writes(statements) == ["UPDATE films"]
+    assert [link["film"]["title"] for link in response.json()["films"]] == ["Engines", "Sketches"]
+
+
+def test_user_columns_bump_the_version(client, user, statements):
+    user["minimun_fee"] = 250
+    response = update(client, user)
+    assert writes(statements) == ["UPDATE users"]
+    assert response.json()["version"] == user["version"] + 1
+
+
+def test_dropped_link_is_deleted_and_film_kept(client, user, statements):
+    dropped = user["films"].pop()
+    response = update(client, user)
+    assert response.status_code == 200, response.text
+    assert "DELETE FROM user_film" in writes(statements)
+    assert not any(statement.startswith(("UPDATE films", "DELETE FROM films")) for statement in writes(statements))
+    assert [link["film"]["title"] for link in response.json()["films"]] == ["Engines"]
+    assert client.get(f"/api/films/{dropped['film']['id']}/").json()["crew_members"] == []
+
+
+def test_new_film_is_inserted_and_linked(client, user, statements):
+    user["films"].append({"role": "producer", "film": film_payload("Difference")})
+    response = update(client, user)
+    assert response.status_code == 200, response.text
+    assert {"INSERT INTO films", "INSERT INTO user_film"} <= set(writes(statements))
+    assert sorted(link["film"]["title"] for link in response.json()["films"]) == ["Difference", "Engines", "Notes"]
+
+
+def test_foreign_film_is_refused(client, user):
+    other = client.post("/api/films/", json=film_payload("Someone else's")).json()
+    user["films"].append({"role": "writer", "film": {**film_payload("Mine now"), "id": other["id"]}})
+    assert update(client, user).status_code == 400
+    assert client.get(f"/api/films/{other['id']}/").json()["title"] == "Someone else's"